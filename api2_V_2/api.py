@@ -1,18 +1,61 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List
 import asyncio
 import uvicorn
 import json
 import os
+import time
+import uuid
 
-from page_requester import GoogleRequester
-from page_parser import DekstopScrape
+from page_parser import DekstopScrape, FEATURE_EXTRACTORS, DISABLED_FEATURES, RULES, feature_stats
+from search_pipeline import SearchPipeline
+from circuit_breaker import CircuitOpenError
+from models import parse_fields, project
+from responses import json_response
+from rank_tracker import RankTracker
+from result_cache import ResultCache
+from scheduler import SearchScheduler
+from prewarm import PrewarmEngine
+from log_setup import request_id_var
+from geotargets import canonical_params, get_index
 import config
 
 app = FastAPI()
 
+# Общий конвейер поисковых запросов (профили, потоки драйверов, контроль частоты)
+pipeline = SearchPipeline()
+
+# История позиций по ключевым запросам
+rank_tracker = RankTracker()
+
+# Кэш распарсенных результатов
+result_cache = ResultCache()
+
+# Планировщик регулярных запросов (результаты попадают в кэш и историю позиций)
+scheduler = SearchScheduler(pipeline, result_cache, rank_tracker)
+
+# Прогрев кэша популярных запросов, пока браузеры простаивают
+prewarm = PrewarmEngine(pipeline, result_cache)
+
+
+@app.on_event("startup")
+async def startup():
+    get_index()  # Индекс геотаргетов загружается один раз при старте
+    pipeline.start()
+    scheduler.start()
+    prewarm.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    scheduler.stop()
+    prewarm.stop()
+    pipeline.shutdown()
+    rank_tracker.close()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -22,6 +65,19 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Присваивает запросу идентификатор, который попадает во все записи лога"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 def get_counter():
     """Получает текущее значение счетчика из файла"""
     try:
@@ -38,6 +94,21 @@ def increment_counter():
         f.write(str(counter))
     return counter
 
+def search_response(request: Request, parsed_data: Dict[str, Any], fields: Optional[str],
+                    **extra) -> JSONResponse:
+    """Формирует ответ /search из распарсенной выдачи (с проекцией полей и сжатием)"""
+    clean_result = {
+        "success": True,
+        "parsed_data": parsed_data,
+        "organic_count": len(parsed_data.get("organic", [])),
+        "ads_count": len(parsed_data.get("ads", [])),
+        **extra
+    }
+    if fields:
+        clean_result["parsed_data"] = project(parsed_data, parse_fields(fields))
+    return json_response(request, clean_result)
+
+
 @app.get("/")
 async def root():
     return {"status": "API is running"}
@@ -45,6 +116,7 @@ async def root():
 
 @app.get("/search")
 async def search(
+    request: Request,
     query: str = Query(..., description="search query"),
     domain: Optional[str] = Query("google.com", description=" (google domain, example: google.com)"),
     num: Optional[int] = Query(10, description="quantity of results (10-100)"),
@@ -53,24 +125,63 @@ async def search(
     lr: Optional[str] = Query('lang_en', description="language results (example, lang_en)"),
     cr: Optional[str] = Query(None, description="country (example, countryUS)"),
     location: Optional[str] = Query(None, description="location (example, 'New York,United States')"),
+    include: Optional[str] = Query(None, description="extra SERP features, comma separated (example, people_also_ask,local_pack)"),
+    hedge: Optional[bool] = Query(None, description="start a second attempt if the first one is slow"),
+    fields: Optional[str] = Query(None, description="return only these fields, comma separated (example, organic.link,organic.position)"),
+    track: bool = Query(False, description="store results in rank history and return only changes"),
+    fresh: bool = Query(False, description="do not serve results from cache"),
 ) -> Dict[str, Any]:
     
-    try:
-        # Инициализация GoogleRequester
-        requester = GoogleRequester()
-        
-        # Выполнение поискового запроса
-        result = await requester.search_google_async(
-            query=query,
-            domain=domain,
-            num=num,
-            gl=gl,
-            hl=hl,
-            lr=lr,
-            cr=cr,
-            location=location,
-            test_pause=0  # Не используем паузу в API
+    # Дополнительные блоки выдачи, которые нужно распарсить
+    features = [f.strip() for f in include.split(',') if f.strip()] if include else []
+    unknown = [f for f in features if f not in FEATURE_EXTRACTORS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown features: {', '.join(unknown)}. Available: {', '.join(FEATURE_EXTRACTORS)}"
         )
+    
+    params = {"query": query, "domain": domain, "num": num, "gl": gl,
+              "hl": hl, "lr": lr, "cr": cr, "location": location}
+    try:
+        # Каноническое имя местоположения и gl его страны
+        params = canonical_params(params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Запоминаем запрос для прогрева кэша
+    if not track:
+        prewarm.observe(params, features)
+
+    # Отдаем результат из кэша (в режиме отслеживания позиций всегда нужна свежая выдача)
+    if not fresh and not track:
+        cached = result_cache.get(params, features)
+        if cached:
+            increment_counter()
+            return search_response(request, cached["parsed_data"], fields,
+                                   cached=True, cached_at=cached["stored_at"])
+    
+    try:
+        # Выполнение поискового запроса (с учетом контроля частоты)
+        try:
+            result = await pipeline.fetch(
+                **params,
+                hedge=config.HEDGE_ENABLED if hedge is None else hedge
+            )
+        except CircuitOpenError as e:
+            # Google отвечает капчами и ошибками: отдаем кэш (даже устаревший) или быстрый отказ
+            cached = None if track else result_cache.get(params, features, allow_stale=True)
+            if cached:
+                return search_response(request, cached["parsed_data"], fields, cached=True,
+                                       cached_at=cached["stored_at"], stale=cached["expires_at"] <= time.time())
+            return JSONResponse(
+                status_code=503,
+                headers={"Retry-After": str(max(1, int(e.retry_after)))},
+                content={
+                    "success": False,
+                    "error": str(e)
+                }
+            )
         
         # Если запрос не удался, возвращаем ошибку
         if not result["success"]:
@@ -85,17 +196,25 @@ async def search(
         if result.get("html"):
             try:
                 scraper = DekstopScrape()
-                parsed_data = await scraper.make_json(result["html"])
-                
-                clean_result = {
-                "success": result["success"],
-                "parsed_data": parsed_data,
-                "organic_count": len(parsed_data.get("organic", [])),
-                "ads_count": len(parsed_data.get("ads", []))
-            }
+                parsed_data = await scraper.make_json(result["html"], include=features)
+                result_cache.put(params, features, parsed_data)
+
+                # Режим отслеживания позиций: сохраняем снимок и отдаем только изменения
+                if track:
+                    loop = asyncio.get_running_loop()
+                    delta = await loop.run_in_executor(
+                        None, rank_tracker.track, params, parsed_data.get("organic", [])
+                    )
+                    increment_counter()
+                    return json_response(request, {
+                        "success": True,
+                        "organic_count": len(parsed_data.get("organic", [])),
+                        "ads_count": len(parsed_data.get("ads", [])),
+                        "delta": delta
+                    })
 
                 increment_counter()
-                return clean_result
+                return search_response(request, parsed_data, fields)
             
             except Exception as e:
                 # В случае ошибки парсинга, добавляем информацию об ошибке
@@ -114,10 +233,198 @@ async def search(
         )
     
 
+@app.get("/locations")
+async def locations(
+    q: str = Query(..., description="location or its beginning (example, 'barcelona' or 'New York,New')"),
+    limit: int = Query(10, description="max suggestions"),
+):
+    """Возвращает геотаргет для местоположения (с UULE, near и gl) и подсказки по префиксу"""
+    index = get_index()
+    target = index.resolve(q)
+    return {
+        "match": target.to_dict() if target else None,
+        "suggestions": [t.to_dict() for t in index.suggest(q, limit)],
+    }
+
+
+@app.get("/admin/geo")
+async def admin_geo():
+    """Возвращает размер индекса геотаргетов и статистику кэша местоположений"""
+    return get_index().stats()
+
+
 @app.get("/counter")
 async def counter():
     """Возвращает текущее значение счетчика успешных запросов"""
     return {"total_requests": get_counter()}
 
+
+@app.get("/history")
+async def history(
+    domain: str = Query(..., description="site domain in results (example, example.com)"),
+    query: Optional[str] = Query(None, description="search query"),
+    limit: int = Query(100, description="max records"),
+):
+    """Возвращает историю позиций домена по отслеживаемым запросам"""
+    loop = asyncio.get_running_loop()
+    items = await loop.run_in_executor(None, rank_tracker.history, domain, query, limit)
+    return {"domain": domain, "items": items}
+
+
+class ScheduledSearch(BaseModel):
+    query: str
+    domain: str = "google.com"
+    num: int = 10
+    gl: Optional[str] = "us"
+    hl: Optional[str] = "en"
+    lr: Optional[str] = "lang_en"
+    cr: Optional[str] = None
+    location: Optional[str] = None
+
+
+class ScheduleRequest(BaseModel):
+    name: Optional[str] = None
+    searches: List[ScheduledSearch]
+    frequency_seconds: int = Field(86400, description="how often to run the searches")
+    window_start: Optional[str] = Field(None, description="UTC time of day, HH:MM (example, 02:00)")
+    window_end: Optional[str] = Field(None, description="UTC time of day, HH:MM (example, 06:00)")
+    include: List[str] = []
+    track: bool = False
+
+
+@app.post("/schedules")
+async def create_schedule(body: ScheduleRequest):
+    """Добавляет расписание регулярных запросов"""
+    unknown = [f for f in body.include if f not in FEATURE_EXTRACTORS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown features: {', '.join(unknown)}")
+    try:
+        return scheduler.add(body.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/schedules")
+async def list_schedules():
+    """Возвращает все расписания"""
+    return list(scheduler.schedules.values())
+
+
+@app.delete("/schedules/{schedule_id}")
+async def delete_schedule(schedule_id: str):
+    """Удаляет расписание"""
+    if not scheduler.remove(schedule_id):
+        raise HTTPException(status_code=404, detail=f"Schedule not found: {schedule_id}")
+    return {"deleted": schedule_id}
+
+
+@app.get("/admin/scheduler")
+async def admin_scheduler():
+    """Возвращает очередь и отставание планировщика от расписания"""
+    return scheduler.metrics()
+
+
+@app.get("/admin/prewarm")
+async def admin_prewarm():
+    """Возвращает популярные запросы и счетчики прогрева кэша"""
+    return prewarm.metrics()
+
+
+@app.get("/admin/cache")
+async def admin_cache():
+    """Возвращает состояние кэша результатов"""
+    return result_cache.stats()
+
+
+@app.get("/admin/rates")
+async def admin_rates():
+    """Возвращает текущие частоты запросов по доменам и прокси-портам"""
+    return pipeline.rate_controller.snapshot()
+
+
+@app.get("/admin/breakers")
+async def admin_breakers():
+    """Возвращает состояние circuit breaker-ов по доменам Google и прокси-хосту"""
+    return pipeline.breakers.snapshot()
+
+
+@app.get("/admin/workers")
+async def admin_workers():
+    """Возвращает загрузку потоков драйверов (busy/idle по каждому воркеру)"""
+    return pipeline.worker_pool.stats()
+
+
+@app.get("/admin/hedging")
+async def admin_hedging():
+    """Возвращает метрики хеджирования запросов и выигрыш по хвостовой задержке"""
+    return pipeline.hedge_policy.metrics()
+
+
+@app.get("/admin/features")
+async def admin_features():
+    """Возвращает стоимость парсинга дополнительных блоков выдачи и их статус"""
+    return feature_stats()
+
+
+@app.post("/admin/features/{name}/disable")
+async def admin_disable_feature(name: str):
+    """Глобально отключает парсинг дополнительного блока выдачи"""
+    if name not in FEATURE_EXTRACTORS:
+        raise HTTPException(status_code=404, detail=f"Unknown feature: {name}")
+    DISABLED_FEATURES.add(name)
+    return feature_stats()[name]
+
+
+@app.post("/admin/features/{name}/enable")
+async def admin_enable_feature(name: str):
+    """Включает парсинг дополнительного блока выдачи"""
+    if name not in FEATURE_EXTRACTORS:
+        raise HTTPException(status_code=404, detail=f"Unknown feature: {name}")
+    DISABLED_FEATURES.discard(name)
+    return feature_stats()[name]
+
+
+@app.get("/admin/parser-rules")
+async def admin_parser_rules():
+    """Возвращает загруженные версии правил парсинга и их успешность на живом трафике"""
+    return RULES.stats()
+
+
+@app.post("/admin/parser-rules/reload")
+async def admin_reload_parser_rules():
+    """Перечитывает файлы правил парсинга (при ошибке остаются текущие правила)"""
+    try:
+        return RULES.reload()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/admin/parser-rules/{version}/traffic")
+async def admin_parser_rules_traffic(version: str, share: float = Query(..., description="share of traffic, 0-1")):
+    """Задает долю трафика, которая парсится версией правил"""
+    try:
+        RULES.set_traffic_share(version, share)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown parser rules version: {version}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return RULES.stats()
+
+
+@app.post("/admin/parser-rules/{version}/default")
+async def admin_parser_rules_default(version: str):
+    """Делает версию правил основной"""
+    try:
+        RULES.set_default(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown parser rules version: {version}")
+    return RULES.stats()
+
+
+@app.get("/admin/browsers")
+async def admin_browsers():
+    """Возвращает метрики памяти и CPU по запущенным браузерам"""
+    return pipeline.supervisor.metrics()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
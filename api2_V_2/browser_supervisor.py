@@ -0,0 +1,263 @@
+"""
+Контроль процессов Chrome и chromedriver.
+Отслеживает деревья процессов всех запущенных браузеров, снимает метрики
+памяти и CPU, перезапускает (убивает) браузеры, превысившие лимит памяти
+или зависшие дольше допустимого, и добивает осиротевшие процессы.
+"""
+
+import asyncio
+import threading
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+import psutil
+
+import config
+
+logger = logging.getLogger('google_requester')
+
+class TrackedBrowser:
+    """Дерево процессов одного браузера (chromedriver + Chrome)."""
+
+    def __init__(self, key: int, root_pids: List[int]):
+        self.key = key
+        self.root_pids = root_pids
+        self.started_at = time.monotonic()
+        self.rss_bytes = 0
+        self.cpu_percent = 0.0
+        self.process_count = 0
+        # Кэш объектов процессов нужен для корректного подсчета cpu_percent между замерами
+        self._processes: Dict[int, psutil.Process] = {}
+
+    def processes(self) -> List[psutil.Process]:
+        """Возвращает все живые процессы дерева."""
+        found = {}
+        for pid in self.root_pids:
+            try:
+                root = self._processes.get(pid) or psutil.Process(pid)
+                found[pid] = root
+                for child in root.children(recursive=True):
+                    found[child.pid] = self._processes.get(child.pid, child)
+            except psutil.Error:
+                continue
+        self._processes = found
+        return list(found.values())
+
+    def sample(self) -> None:
+        """Снимает метрики памяти и CPU по всему дереву процессов."""
+        rss = 0
+        cpu = 0.0
+        processes = self.processes()
+        for proc in processes:
+            try:
+                rss += proc.memory_info().rss
+                cpu += proc.cpu_percent(None)
+            except psutil.Error:
+                continue
+        self.rss_bytes = rss
+        self.cpu_percent = cpu
+        self.process_count = len(processes)
+
+    def kill(self) -> int:
+        """
+        Убивает все процессы дерева.
+
+        Returns:
+            Количество убитых процессов
+        """
+        processes = self.processes()
+        for proc in processes:
+            try:
+                proc.kill()
+            except psutil.Error:
+                pass
+        psutil.wait_procs(processes, timeout=3)
+        return len(processes)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pids": self.root_pids,
+            "age_seconds": round(time.monotonic() - self.started_at, 1),
+            "rss_mb": round(self.rss_bytes / 1024 / 1024, 1),
+            "cpu_percent": round(self.cpu_percent, 1),
+            "processes": self.process_count,
+        }
+
+
+class BrowserSupervisor:
+    """
+    Следит за всеми браузерами, запущенными GoogleRequester.
+    """
+
+    def __init__(self, memory_limit_mb: int = None, hang_deadline: int = None, interval: float = None):
+        """
+        Args:
+            memory_limit_mb: Лимит памяти (RSS) на дерево процессов браузера, МБ
+            hang_deadline: Максимальное время жизни браузера, сек.
+            interval: Интервал между замерами, сек.
+        """
+        self.memory_limit_mb = memory_limit_mb or config.BROWSER_MEMORY_LIMIT_MB
+        self.hang_deadline = hang_deadline or config.BROWSER_HANG_DEADLINE
+        self.interval = interval or config.BROWSER_WATCHDOG_INTERVAL
+        self._lock = threading.Lock()
+        self._browsers: Dict[int, TrackedBrowser] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.recycled = {"memory": 0, "hang": 0, "leftover": 0}
+        self.orphans_reaped = 0
+
+    @staticmethod
+    def _driver_pids(driver) -> List[int]:
+        """Возвращает корневые PID браузера и chromedriver для драйвера."""
+        pids = []
+        browser_pid = getattr(driver, 'browser_pid', None)
+        if browser_pid:
+            pids.append(browser_pid)
+        service = getattr(driver, 'service', None)
+        process = getattr(service, 'process', None)
+        if process is not None and process.pid:
+            pids.append(process.pid)
+        return pids
+
+    def register(self, driver) -> None:
+        """Начинает отслеживать процессы драйвера."""
+        pids = self._driver_pids(driver)
+        if not pids:
+            return
+        with self._lock:
+            self._browsers[id(driver)] = TrackedBrowser(id(driver), pids)
+
+    def unregister(self, driver) -> None:
+        """
+        Прекращает отслеживание драйвера и добивает его оставшиеся процессы
+        (например, если driver.quit() завершился ошибкой).
+        """
+        with self._lock:
+            browser = self._browsers.pop(id(driver), None)
+        if browser:
+            killed = browser.kill()
+            if killed:
+                self.recycled["leftover"] += 1
+                logger.warning(f"После закрытия драйвера остались процессы ({killed}), они завершены")
+
+    def recycle(self, driver) -> bool:
+        """
+        Принудительно убивает браузер драйвера (используется для зависших запросов).
+
+        Returns:
+            True, если браузер отслеживался и был убит
+        """
+        with self._lock:
+            browser = self._browsers.pop(id(driver), None)
+        if not browser:
+            return False
+        browser.kill()
+        return True
+
+    def check(self) -> None:
+        """Снимает метрики и перезапускает браузеры, вышедшие за лимиты."""
+        with self._lock:
+            browsers = list(self._browsers.values())
+
+        limit_bytes = self.memory_limit_mb * 1024 * 1024
+        for browser in browsers:
+            browser.sample()
+            reason = None
+            if browser.rss_bytes > limit_bytes:
+                reason = "memory"
+            elif time.monotonic() - browser.started_at > self.hang_deadline:
+                reason = "hang"
+            if not reason:
+                continue
+
+            logger.warning(f"Браузер {browser.root_pids} перезапускается ({reason}): {browser.stats()}")
+            with self._lock:
+                self._browsers.pop(browser.key, None)
+            browser.kill()
+            self.recycled[reason] += 1
+
+    def reap_orphans(self) -> int:
+        """
+        Завершает процессы браузеров, запущенных этим сервисом, которые не
+        принадлежат ни одному отслеживаемому браузеру: Chrome с нашим флагом
+        запуска (BROWSER_MARKER_ARG) и chromedriver, дочерние процессы которого
+        несут этот флаг. Другие экземпляры Chrome на хосте не затрагиваются.
+
+        Returns:
+            Количество завершенных процессов
+        """
+        with self._lock:
+            tracked = set()
+            for browser in self._browsers.values():
+                tracked.update(p.pid for p in browser.processes())
+
+        marker = config.BROWSER_MARKER_ARG
+        orphans = []
+        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+            info = proc.info
+            if info['pid'] in tracked:
+                continue
+            if marker in (info['cmdline'] or []):
+                orphans.append(proc)
+                continue
+            if 'chromedriver' not in (info['name'] or '').lower():
+                continue
+            try:
+                if any(marker in child.cmdline() for child in proc.children()):
+                    orphans.append(proc)
+            except psutil.Error:
+                continue
+
+        for proc in orphans:
+            try:
+                for child in proc.children(recursive=True):
+                    child.kill()
+                proc.kill()
+            except psutil.Error:
+                pass
+        if orphans:
+            psutil.wait_procs(orphans, timeout=3)
+            logger.warning(f"Завершено осиротевших процессов браузера: {len(orphans)}")
+        self.orphans_reaped += len(orphans)
+        return len(orphans)
+
+    async def _watch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.check)
+            except Exception as e:
+                logger.error(f"Ошибка при проверке браузеров: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Добивает оставшиеся с прошлого запуска процессы и запускает наблюдение."""
+        self.reap_orphans()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    def stop(self) -> None:
+        """Останавливает наблюдение и завершает все браузеры."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        with self._lock:
+            browsers = list(self._browsers.values())
+            self._browsers.clear()
+        for browser in browsers:
+            browser.kill()
+        self.reap_orphans()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Возвращает метрики памяти и CPU по всем браузерам."""
+        with self._lock:
+            browsers = list(self._browsers.values())
+        return {
+            "browsers": len(browsers),
+            "total_rss_mb": round(sum(b.rss_bytes for b in browsers) / 1024 / 1024, 1),
+            "total_cpu_percent": round(sum(b.cpu_percent for b in browsers), 1),
+            "memory_limit_mb": self.memory_limit_mb,
+            "recycled": dict(self.recycled),
+            "orphans_reaped": self.orphans_reaped,
+            "items": [b.stats() for b in browsers],
+        }
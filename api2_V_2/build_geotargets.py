@@ -0,0 +1,119 @@
+"""
+Сборка файла геотаргетов из официальной выгрузки Google Ads
+(https://developers.google.com/google-ads/api/data/geotargets).
+
+Скачивает последнюю выгрузку geotargets-YYYY-MM-DD.csv(.zip), оставляет активные
+геотаргеты (при необходимости - только заданных стран и типов) и записывает их
+в GEOTARGETS_FILE в том же формате CSV.
+
+Примеры:
+    python build_geotargets.py
+    python build_geotargets.py --countries US,GB,DE --types Country,State,City
+    python build_geotargets.py --source geotargets-2024-10-10.csv.zip
+"""
+
+import argparse
+import csv
+import io
+import os
+import re
+import sys
+import urllib.request
+import zipfile
+from typing import Iterable, Optional, Set
+from urllib.parse import urljoin
+
+import config
+
+GEOTARGETS_PAGE = "https://developers.google.com/google-ads/api/data/geotargets"
+EXPORT_LINK = re.compile(r'href="([^"]*geotargets-(\d{4}-\d{2}-\d{2})\.csv(?:\.zip)?)"')
+COLUMNS = ("Criteria ID", "Name", "Canonical Name", "Parent ID", "Country Code", "Target Type", "Status")
+
+
+def latest_export_url(page_url: str = GEOTARGETS_PAGE) -> str:
+    """Находит ссылку на самую свежую выгрузку на странице геотаргетов Google Ads."""
+    with urllib.request.urlopen(page_url, timeout=60) as response:
+        page = response.read().decode("utf-8", errors="replace")
+    links = EXPORT_LINK.findall(page)
+    if not links:
+        raise RuntimeError(f"На странице {page_url} не найдена ссылка на выгрузку геотаргетов")
+    href, _ = max(links, key=lambda link: link[1])
+    return urljoin(page_url, href)
+
+
+def read_export(data: bytes) -> str:
+    """Возвращает текст CSV (выгрузка бывает как в виде CSV, так и в zip-архиве)."""
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            name = next(n for n in archive.namelist() if n.lower().endswith(".csv"))
+            data = archive.read(name)
+    return data.decode("utf-8-sig")
+
+
+def build(text: str, output: str, countries: Optional[Set[str]] = None,
+          types: Optional[Set[str]] = None) -> int:
+    """
+    Записывает отфильтрованные геотаргеты в файл.
+
+    Returns:
+        Количество записанных геотаргетов
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [column for column in COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise RuntimeError(f"В выгрузке нет колонок: {', '.join(missing)}")
+
+    folder = os.path.dirname(output)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = output + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, quoting=csv.QUOTE_ALL, extrasaction="ignore")
+        writer.writeheader()
+        for row in reader:
+            if row["Status"] != "Active":
+                continue
+            if countries and row["Country Code"] not in countries:
+                continue
+            if types and row["Target Type"] not in types:
+                continue
+            writer.writerow(row)
+            count += 1
+    if not count:
+        os.remove(tmp_path)
+        raise RuntimeError("После фильтрации не осталось ни одного геотаргета")
+    os.replace(tmp_path, output)
+    return count
+
+
+def _split(value: Optional[str]) -> Optional[Set[str]]:
+    return {item.strip() for item in value.split(",") if item.strip()} if value else None
+
+
+def main(argv: Iterable[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Сборка файла геотаргетов из выгрузки Google Ads")
+    parser.add_argument("--url", help="Ссылка на выгрузку (по умолчанию - самая свежая со страницы Google Ads)")
+    parser.add_argument("--source", help="Уже скачанная выгрузка (.csv или .csv.zip)")
+    parser.add_argument("--output", default=config.GEOTARGETS_FILE, help="Файл результата")
+    parser.add_argument("--countries", help="Коды стран через запятую (например, US,GB,DE)")
+    parser.add_argument("--types", help="Типы геотаргетов через запятую (например, Country,State,City)")
+    args = parser.parse_args(argv)
+
+    if args.source:
+        with open(args.source, "rb") as f:
+            data = f.read()
+        source = args.source
+    else:
+        source = args.url or latest_export_url()
+        with urllib.request.urlopen(source, timeout=300) as response:
+            data = response.read()
+
+    countries = {code.upper() for code in _split(args.countries)} if args.countries else None
+    count = build(read_export(data), args.output, countries, _split(args.types))
+    print(f"Записано геотаргетов: {count} из {source} в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Circuit breaker для запросов к Google.
+При устойчиво высокой доле капч и ошибок (по домену Google) или сетевых ошибок
+(по прокси-хосту) запросы перестают запускать браузер и сразу завершаются
+ошибкой; после паузы пропускается небольшое число пробных запросов, и по их
+результату цепь замыкается снова или остается разомкнутой.
+"""
+
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+import config
+
+logger = logging.getLogger('google_requester')
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Пропуск запроса через цепь: (поколение цепи, пробный ли запрос)
+Ticket = Tuple[int, bool]
+
+# Признаки ошибок прокси и сети в тексте ошибки браузера (net::ERR_*, тайм-ауты, 407)
+PROXY_ERROR_MARKERS = (
+    'err_proxy', 'err_tunnel', 'err_connection', 'err_timed_out', 'err_name_not_resolved',
+    'err_address_unreachable', 'err_internet_disconnected', 'err_socks', 'err_empty_response',
+    'timed out', 'timeout', '407', 'proxy authentication',
+)
+
+
+def is_proxy_failure(error: str) -> bool:
+    """Проверяет, вызвана ли ошибка запроса прокси или сетью (а не ответом Google)."""
+    error = (error or '').lower()
+    return any(marker in error for marker in PROXY_ERROR_MARKERS)
+
+
+def outcomes(result: Optional[Dict[str, Any]]) -> Tuple[Optional[bool], Optional[bool]]:
+    """
+    Раскладывает результат запроса на исходы для цепи домена и цепи прокси-хоста.
+    Капчи и ошибки страницы относятся к домену Google, прокси-хост отвечает только
+    за сетевые ошибки (капча означает, что прокси работает).
+
+    Args:
+        result: Результат GoogleRequester или None, если запрос отменен
+
+    Returns:
+        (исход для домена, исход для прокси); None - исход не учитывается
+    """
+    if result is None:
+        return None, None
+    if result["success"]:
+        return True, True
+    if result.get("captcha"):
+        return False, True
+    if is_proxy_failure(result.get("error")):
+        return None, False
+    return False, None
+
+
+class CircuitOpenError(Exception):
+    """Запрос отклонен, так как цепь разомкнута."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit {name} is open, retry after {retry_after:.0f} s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для одного ключа (домена Google или прокси-хоста).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.window = config.BREAKER_WINDOW
+        self.min_requests = config.BREAKER_MIN_REQUESTS
+        self.failure_threshold = config.BREAKER_FAILURE_THRESHOLD
+        self.open_seconds = config.BREAKER_OPEN_SECONDS
+        self.half_open_probes = config.BREAKER_HALF_OPEN_PROBES
+        self.close_after = config.BREAKER_CLOSE_AFTER
+
+        self.state = CLOSED
+        # Номер состояния цепи: растет при каждой смене состояния
+        self.generation = 0
+        self.outcomes = deque(maxlen=self.window)
+        self.opened_at = 0.0
+        self.in_flight = 0
+        self.probe_successes = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def failure_ratio(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def _set_state(self, state: str) -> None:
+        """Меняет состояние; пропуски, выданные в прежнем состоянии, перестают учитываться."""
+        self.state = state
+        self.generation += 1
+        self.in_flight = 0
+
+    def _open(self) -> None:
+        self._set_state(OPEN)
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning(f"Цепь {self.name} разомкнута (доля неудач {self.failure_ratio():.2f})")
+
+    def _is_probe(self, ticket: Optional[Ticket]) -> bool:
+        """Является ли пропуск пробным запросом текущего полуоткрытого состояния."""
+        return self.state == HALF_OPEN and ticket == (self.generation, True)
+
+    def allow(self) -> Optional[Ticket]:
+        """
+        Проверяет, можно ли выполнить запрос.
+        В полуоткрытом состоянии занимает один из слотов для пробных запросов.
+
+        Returns:
+            Пропуск (поколение цепи, пробный ли запрос) или None, если запрос отклонен
+        """
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                self.rejected += 1
+                return None
+            self._set_state(HALF_OPEN)
+            self.probe_successes = 0
+            logger.info(f"Цепь {self.name} полуоткрыта, пропускаем пробные запросы")
+
+        if self.state == HALF_OPEN:
+            if self.in_flight >= self.half_open_probes:
+                self.rejected += 1
+                return None
+            self.in_flight += 1
+            return self.generation, True
+        return self.generation, False
+
+    def admits(self, ticket: Optional[Ticket]) -> bool:
+        """
+        Проверяет, что запрос с пропуском ticket все еще можно выполнять: цепь замкнута
+        или запрос - пробный запрос текущего полуоткрытого состояния.
+        """
+        if self.state == CLOSED or self._is_probe(ticket):
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: Optional[bool], ticket: Optional[Ticket]) -> None:
+        """
+        Учитывает результат запроса.
+        Результаты запросов, допущенных до смены состояния цепи (например, ждавших в
+        контроле частоты, пока цепь размыкалась), не учитываются.
+
+        Args:
+            success: Успешен ли запрос (None - запрос отменен или исход не относится к цепи)
+            ticket: Пропуск, выданный allow()
+        """
+        if self.state == HALF_OPEN:
+            if not self._is_probe(ticket):
+                return
+            self.in_flight = max(0, self.in_flight - 1)
+            if success is None:
+                return
+            if not success:
+                self._open()
+                return
+            self.probe_successes += 1
+            if self.probe_successes >= self.close_after:
+                self._set_state(CLOSED)
+                self.outcomes.clear()
+                logger.info(f"Цепь {self.name} замкнута")
+        elif self.state == CLOSED and success is not None and ticket and ticket[0] == self.generation:
+            self.outcomes.append(success)
+            if len(self.outcomes) >= self.min_requests and self.failure_ratio() >= self.failure_threshold:
+                self._open()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failure_ratio": round(self.failure_ratio(), 3),
+            "requests_in_window": len(self.outcomes),
+            "retry_after": round(self.retry_after(), 1) if self.state == OPEN else 0,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
+
+
+class BreakerRegistry:
+    """
+    Набор circuit breaker-ов по доменам Google и прокси-хостам.
+    """
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def _get(self, name: str) -> CircuitBreaker:
+        if name not in self._breakers:
+            self._breakers[name] = CircuitBreaker(name)
+        return self._breakers[name]
+
+    @staticmethod
+    def _names(domain: str, proxy_host: Optional[str]) -> List[str]:
+        """Цепи запроса: домен Google и (при работе через прокси) прокси-хост."""
+        names = [f"domain:{domain}"]
+        if proxy_host:
+            names.append(f"proxy:{proxy_host}")
+        return names
+
+    def acquire(self, domain: str, proxy_host: Optional[str]) -> Dict[str, Ticket]:
+        """
+        Проверяет цепи домена и прокси-хоста.
+
+        Returns:
+            Пропуски по цепям (передаются в check и record)
+
+        Raises:
+            CircuitOpenError: если хотя бы одна цепь разомкнута
+        """
+        tickets = {}
+        for name in self._names(domain, proxy_host):
+            breaker = self._get(name)
+            ticket = breaker.allow()
+            if ticket is None:
+                # Освобождаем пробные слоты, уже занятые в других цепях
+                for granted, granted_ticket in tickets.items():
+                    self._breakers[granted].record(None, granted_ticket)
+                raise CircuitOpenError(name, breaker.retry_after())
+            tickets[name] = ticket
+        return tickets
+
+    def check(self, tickets: Dict[str, Ticket]) -> None:
+        """
+        Повторно проверяет цепи уже допущенного запроса (перед запуском браузера,
+        после ожидания в контроле частоты).
+
+        Raises:
+            CircuitOpenError: если цепь разомкнулась после допуска запроса
+        """
+        for name, ticket in tickets.items():
+            breaker = self._breakers[name]
+            if not breaker.admits(ticket):
+                raise CircuitOpenError(name, breaker.retry_after())
+
+    def is_closed(self, domain: str, proxy_host: Optional[str]) -> bool:
+        """Проверяет, что все цепи запроса замкнуты (без занятия пробных слотов)."""
+        return all(
+            self._breakers[name].state == CLOSED
+            for name in self._names(domain, proxy_host) if name in self._breakers
+        )
+
+    def record(self, tickets: Dict[str, Ticket], result: Optional[Dict[str, Any]]) -> None:
+        """
+        Учитывает результат запроса в цепях домена и прокси-хоста (см. outcomes).
+
+        Args:
+            tickets: Пропуски, выданные acquire
+            result: Результат GoogleRequester или None, если запрос отменен
+        """
+        for (name, ticket), success in zip(tickets.items(), outcomes(result)):
+            self._breakers[name].record(success, ticket)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: breaker.snapshot() for name, breaker in self._breakers.items()}
@@ -21,6 +21,13 @@ USE_PROXY = True
 CHROME_VERSION = int(os.getenv("CHROME_VERSION", "134"))
 HEADLESS = True
 TIMEOUT_PAGE_LOAD = int(os.getenv("TIMEOUT_PAGE_LOAD", "30"))
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))  # Одновременно работающих браузеров (и потоков для них)
+
+# Настройки контроля процессов браузера
+BROWSER_MEMORY_LIMIT_MB = int(os.getenv("BROWSER_MEMORY_LIMIT_MB", "1024"))  # Лимит RSS на дерево процессов браузера
+BROWSER_HANG_DEADLINE = int(os.getenv("BROWSER_HANG_DEADLINE", str(TIMEOUT_PAGE_LOAD * 3)))  # Макс. время жизни браузера, сек.
+BROWSER_WATCHDOG_INTERVAL = float(os.getenv("BROWSER_WATCHDOG_INTERVAL", "5"))  # Интервал замеров, сек.
+BROWSER_MARKER_ARG = "--serp-api-managed"  # Флаг запуска, по которому находим свои процессы Chrome
 
 
 # Настройки для сохранения результатов
@@ -30,6 +37,85 @@ SAVE_HTML = False  # Сохранять ли HTML-страницы
 SAVE_SCREENSHOTS = False  # Сохранять ли скриншоты
 SAVE_FAILED_RESULTS = True  # Сохранять ли результаты при ошибках
 
+# Настройки постоянных профилей браузера
+USE_PROFILES = os.getenv("USE_PROFILES", "true").lower() == "true"
+PROFILES_FOLDER = "profiles"
+PROFILE_POOL_SIZE = int(os.getenv("PROFILE_POOL_SIZE", str(BROWSER_POOL_SIZE * 2)))
+PROFILE_CAPTCHA_LIMIT = int(os.getenv("PROFILE_CAPTCHA_LIMIT", "2"))  # Капч подряд до ротации профиля
+
+# Настройки адаптивного контроля частоты запросов (AIMD), запросов в секунду
+RATE_DOMAIN_INITIAL = float(os.getenv("RATE_DOMAIN_INITIAL", "0.5"))
+RATE_DOMAIN_MAX = float(os.getenv("RATE_DOMAIN_MAX", "5"))
+RATE_PROXY_INITIAL = float(os.getenv("RATE_PROXY_INITIAL", "0.2"))
+RATE_PROXY_MAX = float(os.getenv("RATE_PROXY_MAX", "1"))
+RATE_MIN = float(os.getenv("RATE_MIN", "0.02"))
+RATE_INCREASE_STEP = float(os.getenv("RATE_INCREASE_STEP", "0.02"))  # Аддитивное увеличение после успеха
+RATE_DECREASE_FACTOR = float(os.getenv("RATE_DECREASE_FACTOR", "0.5"))  # Мультипликативное уменьшение
+RATE_WINDOW = int(os.getenv("RATE_WINDOW", "20"))  # Количество последних исходов для оценки
+RATE_FAILURE_THRESHOLD = float(os.getenv("RATE_FAILURE_THRESHOLD", "0.2"))  # Доля капч/ошибок для уменьшения
+RATE_DECREASE_COOLDOWN = float(os.getenv("RATE_DECREASE_COOLDOWN", "10"))  # Секунд между уменьшениями
+RATE_PORT_CHOICES = int(os.getenv("RATE_PORT_CHOICES", "4"))  # Сколько портов сравнивать при выборе
+
+# Настройки хеджирования запросов
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"  # Хеджирование по умолчанию для /search
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))  # Перцентиль задержки, после которого запускается хедж
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))  # Максимальная доля запросов с хеджем
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # Минимум замеров для расчета перцентиля
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "12"))  # Задержка хеджа, пока замеров мало, сек.
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))  # Количество последних запросов для статистики
+
+# Настройки circuit breaker (по доменам Google и прокси-хосту)
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "30"))  # Количество последних исходов для оценки
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "10"))  # Минимум исходов для размыкания
+BREAKER_FAILURE_THRESHOLD = float(os.getenv("BREAKER_FAILURE_THRESHOLD", "0.6"))  # Доля неудач для размыкания
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "120"))  # Сколько цепь остается разомкнутой
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))  # Одновременных пробных запросов
+BREAKER_CLOSE_AFTER = int(os.getenv("BREAKER_CLOSE_AFTER", "3"))  # Успешных проб для замыкания
+
+# Настройки правил парсинга (версионированные файлы с селекторами)
+PARSER_RULES_FOLDER = os.getenv("PARSER_RULES_FOLDER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules"))
+PARSER_RULES_DEFAULT = os.getenv("PARSER_RULES_DEFAULT", "v1")  # Версия, которая обрабатывает основной трафик
+
+# Настройки геотаргетов (местоположение -> каноническое имя, UULE, near, gl)
+GEOTARGETS_FILE = os.getenv("GEOTARGETS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "geo", "geotargets.csv"))
+GEO_CACHE_SIZE = int(os.getenv("GEO_CACHE_SIZE", "4096"))  # Количество запоминаемых местоположений
+GEO_FUZZY_CUTOFF = float(os.getenv("GEO_FUZZY_CUTOFF", "0.8"))  # Минимальное сходство при поиске с опечатками
+GEO_STRICT = os.getenv("GEO_STRICT", "false").lower() == "true"  # Отклонять неизвестные местоположения
+
+# Дополнительные блоки выдачи, отключенные глобально (через запятую, например "knowledge_panel,local_pack")
+DISABLED_FEATURES = [f.strip() for f in os.getenv("DISABLED_FEATURES", "").split(",") if f.strip()]
+
+# Настройки истории позиций (rank tracking)
+HISTORY_DB = os.getenv("HISTORY_DB", "history_data/history.sqlite3")
+
+# Настройки кэша результатов
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # Время жизни результата в кэше, сек. (0 - кэш отключен)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Настройки планировщика регулярных запросов
+SCHEDULES_FILE = os.getenv("SCHEDULES_FILE", "schedules_data/schedules.json")
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", str(BROWSER_POOL_SIZE)))  # Одновременных запросов по расписанию
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.5"))  # Случайный сдвиг запуска (доля интервала между запусками)
+SCHEDULER_MIN_FREQUENCY = int(os.getenv("SCHEDULER_MIN_FREQUENCY", "300"))  # Минимальная частота расписания, сек.
+SCHEDULER_TICK = float(os.getenv("SCHEDULER_TICK", "30"))  # Максимальный интервал проверки расписаний, сек.
+
+# Настройки прогрева кэша популярных запросов
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() == "true"
+PREWARM_LEAD = float(os.getenv("PREWARM_LEAD", "300"))  # За сколько секунд до истечения записи кэша ее обновлять
+PREWARM_HALF_LIFE = float(os.getenv("PREWARM_HALF_LIFE", "3600"))  # Период полураспада счетчика запроса, сек.
+PREWARM_MIN_SCORE = float(os.getenv("PREWARM_MIN_SCORE", "3"))  # Минимальный счетчик популярного запроса
+PREWARM_MAX_KEYS = int(os.getenv("PREWARM_MAX_KEYS", "200"))  # Сколько самых популярных запросов прогревать
+PREWARM_MAX_TRACKED = int(os.getenv("PREWARM_MAX_TRACKED", "10000"))  # Сколько запросов запоминать
+PREWARM_RESERVE = int(os.getenv("PREWARM_RESERVE", "1"))  # Свободных браузеров, оставляемых для живого трафика
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "2"))  # Одновременных запросов прогрева
+PREWARM_RETRY_DELAY = float(os.getenv("PREWARM_RETRY_DELAY", "300"))  # Пауза после неудачного прогрева, сек.
+PREWARM_TICK = float(os.getenv("PREWARM_TICK", "10"))  # Интервал проверки, сек.
+
+# Настройки сжатия ответов API
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))  # Минимальный размер ответа для сжатия, байт
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
 # Список User-Agent для ротации
 USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36',
@@ -56,6 +142,10 @@ DEFAULT_LANG_LOCATION = "us"
 # Настройки логирования
 LOG_LEVEL = logging.INFO
 LOG_FILE = "google_requester.log"
+LOG_JSON = os.getenv("LOG_JSON", "true").lower() == "true"  # Структурированные записи в формате JSON
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))  # Размер файла лога до ротации
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "0.1"))  # Доля запросов, у которых пишутся частые INFO-строки
 
 
 
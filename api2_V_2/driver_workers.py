@@ -0,0 +1,166 @@
+"""
+Выделенные рабочие потоки для драйверов Chrome.
+Каждый драйвер на время запроса привязан к своему потоку с собственной
+очередью команд: блокирующие вызовы Selenium одного драйвера выполняются
+строго по порядку и не занимают общий пул потоков.
+"""
+
+import asyncio
+import contextvars
+import functools
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, List
+
+import config
+
+logger = logging.getLogger('google_requester')
+
+
+def _set_result(future: asyncio.Future, value: Any) -> None:
+    if not future.done():
+        future.set_result(value)
+
+
+def _set_exception(future: asyncio.Future, exc: BaseException) -> None:
+    if not future.done():
+        future.set_exception(exc)
+
+
+class DriverWorker:
+    """
+    Поток, выполняющий команды одного драйвера по очереди.
+    """
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.busy_time = 0.0
+        self.tasks_done = 0
+        self._busy_since = None
+        self._thread = threading.Thread(target=self._loop, name=f"driver-worker-{worker_id}", daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        """Основной цикл потока: берет команды из очереди и выполняет их."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            func, future, loop = item
+
+            with self._lock:
+                self._busy_since = time.monotonic()
+            try:
+                value = func()
+                loop.call_soon_threadsafe(_set_result, future, value)
+            except BaseException as e:
+                loop.call_soon_threadsafe(_set_exception, future, e)
+            finally:
+                with self._lock:
+                    self.busy_time += time.monotonic() - self._busy_since
+                    self._busy_since = None
+                    self.tasks_done += 1
+
+    async def run(self, func: Callable, *args) -> Any:
+        """
+        Выполняет блокирующую функцию в потоке воркера.
+
+        Args:
+            func: Функция
+            *args: Аргументы функции
+
+        Returns:
+            Результат функции
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Переносим контекст (contextvars) вызывающей корутины в поток воркера
+        ctx = contextvars.copy_context()
+        self._queue.put((functools.partial(ctx.run, func, *args), future, loop))
+        return await future
+
+    def stop(self) -> None:
+        """Останавливает поток после выполнения уже поставленных команд."""
+        self._queue.put(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает загрузку воркера."""
+        with self._lock:
+            now = time.monotonic()
+            busy = self.busy_time + (now - self._busy_since if self._busy_since else 0.0)
+            uptime = now - self.started_at
+            return {
+                "worker_id": self.worker_id,
+                "busy": self._busy_since is not None,
+                "busy_seconds": round(busy, 2),
+                "idle_seconds": round(uptime - busy, 2),
+                "utilization": round(busy / uptime, 4) if uptime > 0 else 0.0,
+                "tasks_done": self.tasks_done,
+                "queued": self._queue.qsize(),
+            }
+
+
+class DriverWorkerPool:
+    """
+    Пул воркеров, размер которого равен количеству одновременно работающих браузеров.
+    Воркер выдается на все время работы одного драйвера.
+    """
+
+    def __init__(self, size: int = None):
+        self.size = size or config.BROWSER_POOL_SIZE
+        self.workers: List[DriverWorker] = [DriverWorker(i) for i in range(self.size)]
+        self._free = deque(self.workers)
+        self._waiters = deque()
+
+    @property
+    def free_count(self) -> int:
+        return len(self._free)
+
+    async def acquire(self) -> DriverWorker:
+        """
+        Выдает свободного воркера, при необходимости ожидая его освобождения.
+
+        Returns:
+            Воркер
+        """
+        if self._free:
+            return self._free.popleft()
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Воркер мог быть выдан одновременно с отменой - возвращаем его в пул
+            if future.done() and not future.cancelled():
+                self.release(future.result())
+            raise
+
+    def release(self, worker: DriverWorker) -> None:
+        """Возвращает воркера в пул или отдает его первому ожидающему."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(worker)
+                return
+        self._free.append(worker)
+
+    def stop(self) -> None:
+        """Останавливает все потоки пула."""
+        for worker in self.workers:
+            worker.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает загрузку всех воркеров."""
+        return {
+            "size": self.size,
+            "free": len(self._free),
+            "waiting": sum(1 for w in self._waiters if not w.done()),
+            "workers": [worker.stats() for worker in self.workers],
+        }
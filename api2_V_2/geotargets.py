@@ -0,0 +1,282 @@
+"""
+Офлайн-индекс геотаргетов Google (формат geotargets CSV из Google Ads API).
+Индекс загружается один раз; строка location приводится к каноническому
+имени геотаргета (точное совпадение, однозначный префикс из целых частей имени,
+нечеткий поиск через difflib), по которому строятся UULE, near и gl. Подсказки
+/locations ищутся по любому префиксу через bisect. Результаты поиска популярных
+местоположений кэшируются.
+"""
+
+import base64
+import bisect
+import csv
+import difflib
+import functools
+import logging
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+import config
+
+logger = logging.getLogger('google_requester')
+
+# Символ длины канонического имени в UULE
+UULE_KEY = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+
+# Предпочтение типов геотаргетов, если одному имени соответствует несколько записей
+TARGET_TYPE_PRIORITY = ('City', 'Country', 'State', 'Province', 'Region', 'Autonomous Community',
+                        'County', 'Municipality', 'Neighborhood', 'Postal Code')
+
+# Распространенные неофициальные коды стран в уточнениях ("London,UK")
+COUNTRY_ALIASES = {'uk': 'gb', 'usa': 'us'}
+
+
+@dataclass(frozen=True)
+class GeoTarget:
+    __slots__ = ('criteria_id', 'name', 'canonical_name', 'country_code', 'target_type')
+    criteria_id: Optional[int]
+    name: str
+    canonical_name: str
+    country_code: str
+    target_type: str
+
+    @property
+    def uule(self) -> str:
+        return create_uule(self.canonical_name)
+
+    @property
+    def gl(self) -> str:
+        return self.country_code.lower()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'criteria_id': self.criteria_id,
+            'name': self.name,
+            'canonical_name': self.canonical_name,
+            'country_code': self.country_code,
+            'target_type': self.target_type,
+            'uule': self.uule,
+            'near': self.name,
+            'gl': self.gl,
+        }
+
+
+def create_uule(canonical_name: str) -> str:
+    """
+    Кодирует каноническое имя геотаргета в параметр UULE:
+    "w+CAIQICI" + символ длины имени в байтах + base64(имя).
+
+    Args:
+        canonical_name: Каноническое имя, например 'Barcelona,Catalonia,Spain'
+    """
+    name = canonical_name.encode('utf-8')
+    if len(name) < len(UULE_KEY):
+        return "w+CAIQICI" + UULE_KEY[len(name)] + base64.b64encode(name).decode()
+    # Длина не помещается в один символ - кодируем сообщение целиком (длина как varint)
+    length, varint = len(name), bytearray()
+    while True:
+        byte, length = length & 0x7F, length >> 7
+        varint.append(byte | (0x80 if length else 0))
+        if not length:
+            break
+    message = bytes([0x08, 0x02, 0x10, 0x20, 0x22]) + bytes(varint) + name
+    return "w+" + base64.urlsafe_b64encode(message).decode().rstrip('=')
+
+
+def normalize(value: str) -> str:
+    """Приводит строку местоположения к виду для сравнения (регистр, диакритика, пробелы)."""
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    parts = [' '.join(part.split()) for part in value.lower().split(',')]
+    return ','.join(part for part in parts if part)
+
+
+class GeoIndex:
+    """
+    Индекс геотаргетов в памяти: отсортированный список канонических имен
+    (для поиска по префиксу) и словари по точному имени.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: Файл геотаргетов в формате Google (Criteria ID, Name, Canonical Name, ...)
+        """
+        self.path = path or config.GEOTARGETS_FILE
+        self.targets: List[GeoTarget] = []
+        # Отсортированные (нормализованное каноническое имя, индекс цели)
+        self._canonical: List[Tuple[str, int]] = []
+        self._by_canonical: Dict[str, int] = {}
+        self._by_name: Dict[str, List[int]] = {}
+        self._names: List[str] = []
+        # Имена по первой букве, отсортированные по длине (кандидаты для нечеткого поиска)
+        self._fuzzy: Dict[str, Tuple[List[int], List[str]]] = {}
+        self._load()
+        self.resolve = functools.lru_cache(maxsize=config.GEO_CACHE_SIZE)(self._resolve)
+
+    def _load(self) -> None:
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                if row.get('Status', 'Active') != 'Active':
+                    continue
+                target = GeoTarget(
+                    criteria_id=int(row['Criteria ID']) if row.get('Criteria ID') else None,
+                    name=row['Name'],
+                    canonical_name=row['Canonical Name'],
+                    country_code=row['Country Code'],
+                    target_type=row['Target Type'],
+                )
+                index = len(self.targets)
+                self.targets.append(target)
+                key = normalize(target.canonical_name)
+                self._by_canonical.setdefault(key, index)
+                self._canonical.append((key, index))
+                self._by_name.setdefault(normalize(target.name), []).append(index)
+        self._canonical.sort()
+        self._names = sorted(self._by_name)
+        for name in sorted(self._by_name, key=len):
+            lengths, names = self._fuzzy.setdefault(name[0], ([], []))
+            lengths.append(len(name))
+            names.append(name)
+        logger.info(f"Загружено геотаргетов: {len(self.targets)} из {self.path}")
+
+    def _best(self, indexes: List[int]) -> Optional[GeoTarget]:
+        """Выбирает наиболее подходящую цель (по типу, затем по длине имени)."""
+        if not indexes:
+            return None
+
+        def rank(index):
+            target = self.targets[index]
+            priority = TARGET_TYPE_PRIORITY.index(target.target_type) \
+                if target.target_type in TARGET_TYPE_PRIORITY else len(TARGET_TYPE_PRIORITY)
+            return priority, len(target.canonical_name), index
+
+        return self.targets[min(indexes, key=rank)]
+
+    def _matches_qualifiers(self, index: int, qualifiers: List[str]) -> bool:
+        """Проверяет, что уточнения ("Texas", "US") входят в каноническое имя цели."""
+        target = self.targets[index]
+        parts = set(normalize(target.canonical_name).split(','))
+        parts.add(target.country_code.lower())
+        return all(COUNTRY_ALIASES.get(q, q) in parts for q in qualifiers)
+
+    def _prefix(self, key: str) -> List[int]:
+        found = []
+        position = bisect.bisect_left(self._canonical, (key,))
+        while position < len(self._canonical) and self._canonical[position][0].startswith(key):
+            found.append(self._canonical[position][1])
+            position += 1
+        return found
+
+    def _fuzzy_candidates(self, name: str) -> List[str]:
+        """
+        Имена для нечеткого сравнения: с той же первой буквы и подходящей длины.
+        При пороге cutoff сходство difflib (2 * совпадения / сумма длин) недостижимо,
+        если длины отличаются сильнее, чем в cutoff / (2 - cutoff) раз, - такие имена
+        не сравниваются, поэтому поиск не перебирает весь индекс.
+        """
+        lengths, names = self._fuzzy.get(name[0], ([], []))
+        cutoff = config.GEO_FUZZY_CUTOFF
+        low = bisect.bisect_left(lengths, len(name) * cutoff / (2 - cutoff))
+        high = bisect.bisect_right(lengths, len(name) * (2 - cutoff) / cutoff)
+        return names[low:high]
+
+    def _resolve(self, location: str) -> Optional[GeoTarget]:
+        key = normalize(location)
+        if not key:
+            return None
+
+        # Точное каноническое имя
+        if key in self._by_canonical:
+            return self.targets[self._by_canonical[key]]
+
+        # Имя с уточнениями: "Barcelona,Spain", "Austin,Texas,US"
+        name, *qualifiers = key.split(',')
+        candidates = [i for i in self._by_name.get(name, []) if self._matches_qualifiers(i, qualifiers)]
+        if candidates:
+            return self._best(candidates)
+
+        # Однозначный префикс из целых частей канонического имени:
+        # "barcelona,catalonia" -> "Barcelona,Catalonia,Spain" (но не "new" -> "New Delhi,...")
+        candidates = self._prefix(key + ',')
+        if len(candidates) == 1:
+            return self.targets[candidates[0]]
+
+        # Опечатки в названии: "Barcelna" -> "Barcelona" (первая буква должна совпадать)
+        candidates = self._fuzzy_candidates(name)
+        for close in difflib.get_close_matches(name, candidates, n=5, cutoff=config.GEO_FUZZY_CUTOFF):
+            candidates = [i for i in self._by_name[close] if self._matches_qualifiers(i, qualifiers)]
+            if candidates:
+                return self._best(candidates)
+        return None
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[GeoTarget]:
+        """Подсказки по началу канонического имени или названия."""
+        key = normalize(prefix)
+        if not key:
+            return []
+        indexes = self._prefix(key)
+        position = bisect.bisect_left(self._names, key)
+        while position < len(self._names) and self._names[position].startswith(key):
+            indexes.extend(self._by_name[self._names[position]])
+            position += 1
+        seen, suggestions = set(), []
+        for index in indexes:
+            if index not in seen:
+                seen.add(index)
+                suggestions.append(self.targets[index])
+        suggestions.sort(key=lambda t: (t.target_type != 'Country', len(t.canonical_name)))
+        return suggestions[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        info = self.resolve.cache_info()
+        return {
+            'targets': len(self.targets),
+            'file': self.path,
+            'cache_hits': info.hits,
+            'cache_misses': info.misses,
+            'cache_size': info.currsize,
+        }
+
+
+_index: Optional[GeoIndex] = None
+
+
+def get_index() -> GeoIndex:
+    """Индекс геотаргетов (загружается при первом обращении)."""
+    global _index
+    if _index is None:
+        _index = GeoIndex()
+    return _index
+
+
+def resolve_location(location: Optional[str]) -> Optional[GeoTarget]:
+    """
+    Находит геотаргет для строки местоположения.
+
+    Returns:
+        GeoTarget или None, если местоположение не найдено
+    """
+    if not location:
+        return None
+    return get_index().resolve(location)
+
+
+def canonical_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Приводит location в параметрах поиска к каноническому имени, а gl - к стране
+    местоположения (чтобы разные написания одного места давали один ключ кэша).
+
+    Raises:
+        ValueError: если местоположение не найдено, а включен GEO_STRICT
+    """
+    location = params.get('location')
+    if not location:
+        return params
+    target = resolve_location(location)
+    if target:
+        return dict(params, location=target.canonical_name, gl=target.gl)
+    if config.GEO_STRICT:
+        raise ValueError(f"Unknown location: {location}")
+    return params
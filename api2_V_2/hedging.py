@@ -0,0 +1,148 @@
+"""
+Хеджирование запросов для сокращения хвостовых задержек.
+Если первая попытка не завершилась за время, равное заданному перцентилю
+задержек, запускается вторая попытка через другой прокси и User-Agent;
+используется первый успешный результат.
+"""
+
+import math
+from collections import deque
+from typing import Dict, Any, Iterable, Optional
+
+import config
+
+
+def percentile(values: Iterable[float], p: float) -> Optional[float]:
+    """
+    Возвращает p-й перцентиль (0-100) по методу ближайшего ранга.
+
+    Returns:
+        Значение перцентиля или None, если значений нет
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class HedgePolicy:
+    """
+    Решает, когда запускать хедж-попытку, следит за бюджетом хеджей
+    и собирает метрики задержек.
+    """
+
+    def __init__(self, percentile_value: float = None, max_ratio: float = None,
+                 window: int = None, min_samples: int = None, default_delay: float = None):
+        """
+        Args:
+            percentile_value: Перцентиль задержки, после которого запускается хедж
+            max_ratio: Максимальная доля запросов, для которых запускается хедж
+            window: Количество последних запросов для статистики
+            min_samples: Минимум замеров для расчета перцентиля
+            default_delay: Задержка хеджа, пока замеров недостаточно (сек.)
+        """
+        self.percentile = percentile_value or config.HEDGE_PERCENTILE
+        self.max_ratio = max_ratio if max_ratio is not None else config.HEDGE_MAX_RATIO
+        self.min_samples = min_samples or config.HEDGE_MIN_SAMPLES
+        self.default_delay = default_delay or config.HEDGE_DEFAULT_DELAY
+        window = window or config.HEDGE_WINDOW
+
+        # Задержки завершенных попыток (по ним считается порог хеджа)
+        self.attempt_latencies = deque(maxlen=window)
+        # Задержки ответа клиенту в режиме хеджирования
+        self.served_latencies = deque(maxlen=window)
+        # Задержки первой попытки; для отмененных - оценка (см. estimate_primary),
+        # отмененные попытки без оценки сюда не попадают (счетчик primary_unknown)
+        self.primary_latencies = deque(maxlen=window)
+        # Был ли запущен хедж для последних запросов (для бюджета)
+        self.decisions = deque(maxlen=window)
+
+        self.counters = {
+            "requests": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "budget_denied": 0,
+            "no_capacity": 0,
+            "primary_unknown": 0,
+        }
+        self.saved_seconds = 0.0
+
+    def observe_attempt(self, latency: float) -> None:
+        """Учитывает задержку завершенной попытки."""
+        self.attempt_latencies.append(latency)
+
+    def delay(self) -> float:
+        """Возвращает время, после которого запускается хедж-попытка."""
+        if len(self.attempt_latencies) < self.min_samples:
+            return self.default_delay
+        return percentile(self.attempt_latencies, self.percentile)
+
+    def allow(self) -> bool:
+        """Проверяет, не превышен ли бюджет хеджей."""
+        if not self.decisions:
+            return self.max_ratio > 0
+        return sum(self.decisions) / len(self.decisions) < self.max_ratio
+
+    def estimate_primary(self, cancelled_after: float) -> Optional[float]:
+        """
+        Оценивает, сколько выполнялась бы отмененная первая попытка:
+        среднее по попыткам, которые длились дольше cancelled_after.
+
+        Returns:
+            Оценка или None, если таких попыток не было (оценить нельзя)
+        """
+        slower = [latency for latency in self.attempt_latencies if latency > cancelled_after]
+        if not slower:
+            return None
+        return sum(slower) / len(slower)
+
+    def record(self, hedged: bool, served_latency: float, primary_latency: float,
+               hedge_won: bool = False, primary_cancelled: bool = False) -> None:
+        """
+        Учитывает завершенный запрос в режиме хеджирования.
+
+        Args:
+            hedged: Была ли запущена хедж-попытка
+            served_latency: Задержка ответа клиенту
+            primary_latency: Задержка первой попытки (или время до ее отмены)
+            hedge_won: Был ли использован результат хедж-попытки
+            primary_cancelled: Была ли первая попытка отменена (тогда ее задержка оценивается,
+                а выигрыш по времени учитывается в saved_seconds)
+        """
+        if primary_cancelled:
+            primary_latency = self.estimate_primary(primary_latency)
+            if primary_latency is None:
+                self.counters["primary_unknown"] += 1
+            else:
+                self.saved_seconds += primary_latency - served_latency
+        self.counters["requests"] += 1
+        self.decisions.append(1 if hedged else 0)
+        self.served_latencies.append(served_latency)
+        if primary_latency is not None:
+            self.primary_latencies.append(primary_latency)
+        if hedged:
+            self.counters["hedged"] += 1
+            self.counters["hedge_wins" if hedge_won else "primary_wins"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Возвращает метрики хеджирования и выигрыш по хвостовой задержке."""
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+
+        served_p99 = percentile(self.served_latencies, 99)
+        primary_p99 = percentile(self.primary_latencies, 99)
+        return {
+            **self.counters,
+            "hedge_ratio": rounded(sum(self.decisions) / len(self.decisions)) if self.decisions else 0.0,
+            "max_ratio": self.max_ratio,
+            "current_delay": rounded(self.delay()),
+            "served_p50": rounded(percentile(self.served_latencies, 50)),
+            "served_p99": rounded(served_p99),
+            # Для отмененных первых попыток задержка оценивается по распределению прошлых попыток
+            "primary_p99_estimated": rounded(primary_p99),
+            "p99_cut_estimated": rounded(primary_p99 - served_p99)
+            if primary_p99 is not None and served_p99 is not None else None,
+            "saved_seconds_total": rounded(self.saved_seconds),
+        }
@@ -0,0 +1,102 @@
+"""
+Неблокирующее структурированное логирование.
+Записи попадают в очередь (QueueHandler) и пишутся в консоль и файл
+отдельным потоком (QueueListener) в формате JSON с идентификатором запроса.
+Частые информационные строки сэмплируются.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import zlib
+from datetime import datetime, timezone
+
+import config
+
+# Идентификатор текущего запроса (переносится в потоки драйверов вместе с контекстом)
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# extra для частых информационных строк, которые можно сэмплировать
+SAMPLED = {'sampled': True}
+
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Добавляет в запись идентификатор запроса из контекста вызывающего кода."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю записей, помеченных SAMPLED.
+    Решение принимается по идентификатору запроса, поэтому у запроса
+    сохраняются либо все такие строки, либо ни одной.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'sampled', False) or record.levelno > logging.INFO or self.rate >= 1:
+            return True
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            return zlib.crc32(request_id.encode()) % 10000 < self.rate * 10000
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как одну строку JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def setup_logging() -> None:
+    """Настраивает логирование через очередь (повторный вызов ничего не делает)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if config.LOG_JSON else logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+    )
+    file_handler = logging.handlers.RotatingFileHandler(
+        config.LOG_FILE, maxBytes=config.LOG_MAX_BYTES, backupCount=config.LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Фильтры выполняются в потоке, который пишет в лог, - там доступен контекст запроса
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(SamplingFilter(config.LOG_INFO_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.setLevel(config.LOG_LEVEL)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
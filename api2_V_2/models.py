@@ -0,0 +1,102 @@
+"""
+Компактные типизированные модели результатов выдачи.
+Классы с __slots__ занимают меньше памяти, чем словари, и сериализуются
+orjson напрямую (без промежуточного преобразования в dict).
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+
+@dataclass
+class Sitelink:
+    __slots__ = ('url', 'text')
+    url: str
+    text: str
+
+
+@dataclass
+class OrganicResult:
+    __slots__ = ('position', 'domain', 'title', 'snippet', 'link', 'sitelinks')
+    position: str
+    domain: str
+    title: str
+    snippet: str
+    link: str
+    sitelinks: List[Sitelink]
+
+
+@dataclass
+class AdSitelink:
+    __slots__ = ('title', 'description', 'link', 'tracking_link')
+    title: str
+    description: Optional[str]
+    link: str
+    tracking_link: Optional[str]
+
+
+@dataclass
+class AdResult:
+    __slots__ = ('position', 'domain', 'source', 'link', 'tracking_link', 'title', 'description', 'sitelinks')
+    position: int
+    domain: Optional[str]
+    source: Optional[str]
+    link: Optional[str]
+    tracking_link: Optional[str]
+    title: Optional[str]
+    description: Optional[str]
+    sitelinks: List[AdSitelink]
+
+
+def _get(item: Any, name: str) -> Any:
+    if isinstance(item, dict):
+        return item.get(name)
+    return getattr(item, name, None)
+
+
+def parse_fields(fields: Optional[str]) -> Dict[str, Optional[List[str]]]:
+    """
+    Разбирает параметр проекции полей.
+
+    Args:
+        fields: Строка вида "organic.link,organic.position,ads"
+
+    Returns:
+        Словарь: блок -> список полей (None - блок целиком)
+    """
+    projection: Dict[str, Optional[List[str]]] = {}
+    for field in (fields or '').split(','):
+        field = field.strip()
+        if not field:
+            continue
+        block, _, name = field.partition('.')
+        if not name:
+            projection[block] = None
+        elif block not in projection or projection[block] is not None:
+            projection.setdefault(block, []).append(name)
+    return projection
+
+
+def project(parsed_data: Dict[str, Any], projection: Dict[str, Optional[List[str]]]) -> Dict[str, Any]:
+    """
+    Оставляет в распарсенной выдаче только запрошенные блоки и поля.
+
+    Args:
+        parsed_data: Результат DekstopScrape.make_json
+        projection: Результат parse_fields
+
+    Returns:
+        Словарь только с запрошенными данными
+    """
+    projected = {}
+    for block, names in projection.items():
+        if block not in parsed_data:
+            continue
+        value = parsed_data[block]
+        if names is None or value is None:
+            projected[block] = value
+        elif isinstance(value, list):
+            projected[block] = [{name: _get(item, name) for name in names} for item in value]
+        else:
+            projected[block] = {name: _get(value, name) for name in names}
+    return projected
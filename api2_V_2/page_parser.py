@@ -5,8 +5,164 @@ import asyncio
 
 from bs4 import BeautifulSoup
 import datetime
+import time
 from urllib.parse import urlparse
 import json
+import logging
+
+import config
+from models import OrganicResult, Sitelink, AdResult, AdSitelink
+from parser_rules import RuleRegistry
+
+logger = logging.getLogger('google_requester')
+
+
+# Версионированные правила парсинга (селекторы из rules/*.json, перезагружаются без рестарта)
+RULES = RuleRegistry()
+
+
+##################################
+# дополнительные блоки выдачи    #
+##################################
+# Реестр экстракторов: имя блока -> функция(soup, rules) -> данные блока
+FEATURE_EXTRACTORS = {}
+# Статистика стоимости парсинга по каждому блоку
+FEATURE_STATS = {}
+# Блоки, отключенные глобально (например, слишком дорогие)
+DISABLED_FEATURES = set(config.DISABLED_FEATURES)
+
+
+def register_feature(name):
+    """Регистрирует экстрактор дополнительного блока выдачи под именем name."""
+    def decorator(func):
+        FEATURE_EXTRACTORS[name] = func
+        FEATURE_STATS[name] = {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'errors': 0}
+        return func
+    return decorator
+
+
+def feature_stats():
+    """Возвращает среднюю и максимальную стоимость парсинга каждого блока."""
+    stats = {}
+    for name, st in FEATURE_STATS.items():
+        stats[name] = {
+            'enabled': name not in DISABLED_FEATURES,
+            'calls': st['calls'],
+            'errors': st['errors'],
+            'avg_ms': round(st['total_ms'] / st['calls'], 3) if st['calls'] else 0.0,
+            'max_ms': round(st['max_ms'], 3),
+        }
+    return stats
+
+
+def run_feature(name, soup, rules):
+    """Запускает экстрактор блока и учитывает время его работы."""
+    st = FEATURE_STATS[name]
+    started = time.perf_counter()
+    try:
+        return FEATURE_EXTRACTORS[name](soup, rules)
+    except Exception as e:
+        st['errors'] += 1
+        logger.warning(f'Ошибка при парсинге блока {name}: {e}')
+        return None
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        st['calls'] += 1
+        st['total_ms'] += elapsed
+        st['max_ms'] = max(st['max_ms'], elapsed)
+
+
+def _text(tag):
+    return tag.get_text(' ', strip=True) if tag else None
+
+
+@register_feature('people_also_ask')
+def extract_people_also_ask(soup, rules):
+    questions = []
+    for item in rules.select(soup, 'people_also_ask.item'):
+        question = item.get('data-q') or _text(rules.select_one(item, 'people_also_ask.question'))
+        if not question:
+            continue
+        answer_link = rules.select_one(item, 'people_also_ask.link')
+        questions.append({
+            'question': question,
+            'snippet': _text(rules.select_one(item, 'people_also_ask.snippet')),
+            'link': answer_link.get('href') if answer_link else None,
+        })
+    return questions
+
+
+@register_feature('local_pack')
+def extract_local_pack(soup, rules):
+    places = []
+    for c, item in enumerate(rules.select(soup, 'local_pack.item'), start=1):
+        name = _text(rules.select_one(item, 'local_pack.title'))
+        if not name:
+            continue
+        details = [_text(d) for d in rules.select(item, 'local_pack.details')]
+        website = rules.select_one(item, 'local_pack.website')
+        places.append({
+            'position': c,
+            'title': name,
+            'rating': _text(rules.select_one(item, 'local_pack.rating')),
+            'reviews': _text(rules.select_one(item, 'local_pack.reviews')),
+            'details': [d for d in details if d],
+            'website': website.get('href') if website else None,
+        })
+    return places
+
+
+@register_feature('top_stories')
+def extract_top_stories(soup, rules):
+    stories = []
+    for c, item in enumerate(rules.select(soup, 'top_stories.item'), start=1):
+        title = _text(rules.select_one(item, 'top_stories.title'))
+        if not title:
+            continue
+        link = item.get('href')
+        stories.append({
+            'position': c,
+            'title': title,
+            'link': link,
+            'domain': urlparse(link).netloc if link else None,
+            'source': _text(rules.select_one(item, 'top_stories.source')),
+            'date': _text(rules.select_one(item, 'top_stories.date')),
+        })
+    return stories
+
+
+@register_feature('related_searches')
+def extract_related_searches(soup, rules):
+    related = []
+    seen = set()
+    for item in rules.select(soup, 'related_searches.item'):
+        query = _text(rules.select_one(item, 'related_searches.query')) or _text(item)
+        if not query or query in seen:
+            continue
+        seen.add(query)
+        related.append({'query': query, 'link': item.get('href')})
+    return related
+
+
+@register_feature('knowledge_panel')
+def extract_knowledge_panel(soup, rules):
+    panel = rules.select_one(soup, 'knowledge_panel.panel')
+    if not panel:
+        return None
+    source = rules.select_one(panel, 'knowledge_panel.source')
+    attributes = {}
+    for row in rules.select(panel, 'knowledge_panel.attribute'):
+        label = _text(rules.select_one(row, 'knowledge_panel.attribute_label'))
+        value = _text(rules.select_one(row, 'knowledge_panel.attribute_value'))
+        if label and value:
+            attributes[label.rstrip(': ')] = value
+    return {
+        'title': _text(rules.select_one(panel, 'knowledge_panel.title')),
+        'type': _text(rules.select_one(panel, 'knowledge_panel.type')),
+        'description': _text(rules.select_one(panel, 'knowledge_panel.description')),
+        'source': source.get('href') if source else None,
+        'attributes': attributes,
+    }
 
 
 class DekstopScrape:
@@ -16,20 +172,20 @@ class DekstopScrape:
     ###################
     # organic results #
     ###################
-    def searching_organic(self, soup):
+    def searching_organic(self, soup, rules):
         organic_list = []
         seen_urls = set()  # Create a set to store seen URLs
         
-        # Новый селектор для органических результатов
-        all_organic = soup.find_all('div', class_='MjjYud')
+        # Блоки органических результатов
+        all_organic = rules.select(soup, 'organic.item')
         # Исключаем рекламные блоки
-        all_organic = [div for div in all_organic if not div.find('div', class_='uEierd')]
+        all_organic = [div for div in all_organic if not rules.select_one(div, 'organic.exclude')]
         
         c = 0
         for num, item in enumerate(all_organic):
             try:
                 # Ищем ссылку в новой структуре
-                link_element = item.find('a', class_='zReHs')
+                link_element = rules.select_one(item, 'organic.link')
                 if not link_element:
                     continue
                 
@@ -40,14 +196,14 @@ class DekstopScrape:
                 seen_urls.add(link)  # Add the URL to the seen set
                 
                 # Ищем заголовок
-                head_element = item.find('h3', class_='LC20lb')
+                head_element = rules.select_one(item, 'organic.title')
                 if not head_element:
                     continue
                 
                 head = head_element.text.strip()
                 
                 # Ищем сниппет текста (описание)
-                snippet_element = item.find('div', class_='VwiC3b')
+                snippet_element = rules.select_one(item, 'organic.snippet')
                 snippet = snippet_element.text.strip() if snippet_element else ' '
                 
                 if snippet:
@@ -62,32 +218,32 @@ class DekstopScrape:
                 # Collect sitelinks if they exist
                 sitelinks = []
                 # Ищем сайтлинки в новой структуре
-                sitelinks_container = item.find('div', class_=['HiHjCd', 'X7NTVe'])
+                sitelinks_container = rules.select_one(item, 'organic.sitelinks')
                 if sitelinks_container:
-                    sitelinks_elements = sitelinks_container.find_all('a', href=True)
+                    sitelinks_elements = rules.select(sitelinks_container, 'organic.sitelink')
                     for slink in sitelinks_elements:
                         sitelink_url = slink['href']
                         sitelink_text = slink.text.strip()
-                        sitelinks.append({'url': sitelink_url, 'text': sitelink_text})
+                        sitelinks.append(Sitelink(sitelink_url, sitelink_text))
                 
                 # Если сайтлинки не найдены, поищем в других контейнерах
                 if not sitelinks:
-                    sitelinks_container = item.find('table', class_='jmjoTe')
+                    sitelinks_container = rules.select_one(item, 'organic.sitelinks_table')
                     if sitelinks_container:
-                        sitelinks_elements = sitelinks_container.find_all('a', href=True)
+                        sitelinks_elements = rules.select(sitelinks_container, 'organic.sitelink')
                         for slink in sitelinks_elements:
                             sitelink_url = slink['href']
                             sitelink_text = slink.text.strip()
-                            sitelinks.append({'url': sitelink_url, 'text': sitelink_text})
+                            sitelinks.append(Sitelink(sitelink_url, sitelink_text))
                 
-                organic_list.append({
-                    'position': f'{c}', 
-                    'domain': d_key, 
-                    'title': head, 
-                    'snippet': snippet, 
-                    'link': link,
-                    'sitelinks': sitelinks
-                })
+                organic_list.append(OrganicResult(
+                    position=f'{c}', 
+                    domain=d_key, 
+                    title=head, 
+                    snippet=snippet, 
+                    link=link,
+                    sitelinks=sitelinks
+                ))
                 
             except Exception as e:
                 print(f'error in organic results: {e}')
@@ -96,20 +252,20 @@ class DekstopScrape:
 
 
 
-    def searching_sponsored(self, soup):
-        all_sponsored = soup.find_all('div', class_='uEierd')
+    def searching_sponsored(self, soup, rules):
+        all_sponsored = rules.select(soup, 'ads.item')
         spons = []
         c = 0  # счетчик позиции
 
         for item in all_sponsored:
             c += 1
 
-            sponsor_name = item.find('div', class_='Aozhyc Sqrs4e TElO2c OSrXXb')
+            sponsor_name = rules.select_one(item, 'ads.source')
             sponsor_name = sponsor_name.text if sponsor_name else None
 
-            sponsor_link = item.find('a', class_='sVXRqc')
+            sponsor_link = rules.select_one(item, 'ads.link')
             if sponsor_link:
-                title_tag = sponsor_link.find('div', {'role': 'heading'})
+                title_tag = rules.select_one(sponsor_link, 'ads.title')
                 title = title_tag.text if title_tag else None
                 tracking_link = sponsor_link.get('data-rw')
                 href_link = sponsor_link.get('href')
@@ -118,14 +274,14 @@ class DekstopScrape:
             else:
                 title = tracking_link = href_link = domain = None
 
-            description_tag = item.find('div', class_='p4wth')
+            description_tag = rules.select_one(item, 'ads.description')
             spons_descr = description_tag.text.strip() if description_tag else None
 
-            sublinks_section = item.find('div', class_='dcuivd')
+            sublinks_section = rules.select_one(item, 'ads.sitelinks')
             sublinks_list = []
 
             if sublinks_section:
-                sublinks = sublinks_section.find_all('a')
+                sublinks = rules.select(sublinks_section, 'ads.sitelink')
 
                 for sub in sublinks:
                     sub_title = sub.text.strip() if sub else None
@@ -133,33 +289,36 @@ class DekstopScrape:
                     sub_tracking_link = sub.get('data-rw')
 
                     if sub_title and sub_href:
-                        sublinks_list.append({
-                            'title': sub_title,
-                            'description': None,  # Описание для sublink-ов отсутствует
-                            'link': sub_href,
-                            'tracking_link': sub_tracking_link
-                        })
-
-            ad_data = {
-                'position': c,
-                'domain': domain,
-                'source': sponsor_name,
-                'link': href_link,
-                'tracking_link': tracking_link,
-                'title': title,
-                'description': spons_descr
-            }
-
-            if sublinks_list:
-                ad_data['sitelinks'] = sublinks_list
-
-            spons.append(ad_data)
+                        sublinks_list.append(AdSitelink(
+                            title=sub_title,
+                            description=None,  # Описание для sublink-ов отсутствует
+                            link=sub_href,
+                            tracking_link=sub_tracking_link
+                        ))
+
+            spons.append(AdResult(
+                position=c,
+                domain=domain,
+                source=sponsor_name,
+                link=href_link,
+                tracking_link=tracking_link,
+                title=title,
+                description=spons_descr,
+                sitelinks=sublinks_list
+            ))
 
         return spons
 
 
 
-    async def make_json(self, content):
+    async def make_json(self, content, include=None, rules_version=None):
+        """
+        Парсит страницу выдачи.
+        organic и ads извлекаются всегда, дополнительные блоки (см. FEATURE_EXTRACTORS) -
+        только если они перечислены в include и не отключены глобально.
+        Селекторы берутся из версии правил rules_version (по умолчанию - по долям трафика, см. RULES).
+        """
+        rules = RULES.get(rules_version)
         try:
             # Сохраняем HTML для дебага
             with open('last_response_desktop.html', 'w', encoding='utf-8') as f:
@@ -167,11 +326,18 @@ class DekstopScrape:
                 
             soup = BeautifulSoup(content, 'lxml')
             to_json = {}
-            to_json['organic'] = self.searching_organic(soup)
-            to_json['ads'] = self.searching_sponsored(soup)
+            to_json['organic'] = self.searching_organic(soup, rules)
+            to_json['ads'] = self.searching_sponsored(soup, rules)
+            rules.record(len(to_json['organic']), len(to_json['ads']))
+            # Дополнительные блоки парсятся по запросу на том же дереве soup
+            for name in include or []:
+                if name in FEATURE_EXTRACTORS and name not in DISABLED_FEATURES and rules.supports(name):
+                    to_json[name] = run_feature(name, soup, rules)
+            to_json['parser_version'] = rules.version
             # my_json = json.dumps(to_json, indent=4, ensure_ascii=False)
             return to_json
         except Exception as e:
+            rules.record(0, 0, error=True)
             print(f'error in make_json {e}')
 
 # scrap = DekstopScrape()
@@ -10,7 +10,6 @@ import json
 import os
 import shutil
 import urllib.parse
-import base64
 import asyncio
 import logging
 from datetime import datetime
@@ -19,16 +18,14 @@ from selenium.webdriver.common.keys import Keys
 
 # Импорт конфигурационных настроек
 import config
+from log_setup import setup_logging, SAMPLED
+from geotargets import resolve_location, create_uule
+from profile_pool import BrowserProfile
+from driver_workers import DriverWorker
+from browser_supervisor import BrowserSupervisor
 
-# Настройка логирования
-logging.basicConfig(
-    level=config.LOG_LEVEL,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(config.LOG_FILE, encoding='utf-8')
-    ]
-)
+# Настройка логирования (через очередь, запись в файл выполняет отдельный поток)
+setup_logging()
 logger = logging.getLogger('google_requester')
 
 
@@ -38,11 +35,27 @@ class GoogleRequester:
     Поддерживает работу через прокси и сохранение HTML-страниц результатов.
     """
     
-    def __init__(self):
-        """Инициализация класса GoogleRequester."""
+    def __init__(self, profile: Optional[BrowserProfile] = None, proxy_port: Optional[str] = None,
+                 worker: Optional[DriverWorker] = None, supervisor: Optional[BrowserSupervisor] = None,
+                 user_agent: Optional[str] = None):
+        """
+        Инициализация класса GoogleRequester.
+        
+        Args:
+            profile: Постоянный профиль браузера (если None - используется временный профиль)
+            proxy_port: Порт прокси (если None - выбирается случайно или берется из профиля)
+            worker: Выделенный поток для команд драйвера (если None - общий пул потоков)
+            supervisor: Контроль процессов браузера (память, зависания, осиротевшие процессы)
+            user_agent: User-Agent (если None - выбирается случайно из config.USER_AGENTS)
+        """
         self.driver = None
         self.current_proxy = None
         self.current_user_agent = None
+        self.profile = profile
+        self.proxy_port = proxy_port
+        self.worker = worker
+        self.supervisor = supervisor
+        self.user_agent = user_agent
         
         # Создаем необходимые директории
         os.makedirs(config.RESULTS_FOLDER, exist_ok=True)
@@ -61,9 +74,9 @@ class GoogleRequester:
         if not location:
             return None
             
-        # Формат UULE: "w+CAIQICI" + base64(location)
-        encoded_location = base64.b64encode(location.encode()).decode()
-        return f"w+CAIQICI{encoded_location}"
+        # Кодируем каноническое имя геотаргета, если местоположение найдено в индексе
+        target = resolve_location(location)
+        return create_uule(target.canonical_name if target else location)
     
     def create_proxy_extension(self, proxy_host: str, proxy_port: str, 
                               proxy_user: str, proxy_pass: str, 
@@ -164,13 +177,16 @@ class GoogleRequester:
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--no-sandbox')
         
+        # Метка, по которой находим свои процессы Chrome (см. BrowserSupervisor)
+        options.add_argument(config.BROWSER_MARKER_ARG)
+        
         # Случайное разрешение экрана
         screen_width = random.randint(1200, 1920)
         screen_height = random.randint(800, 1080)
         options.add_argument(f'--window-size={screen_width},{screen_height}')
         
-        # Случайный User-Agent
-        self.current_user_agent = random.choice(config.USER_AGENTS)
+        # Заданный или случайный User-Agent
+        self.current_user_agent = self.user_agent or random.choice(config.USER_AGENTS)
         options.add_argument(f'--user-agent={self.current_user_agent}')
         
         return options
@@ -182,9 +198,15 @@ class GoogleRequester:
         Returns:
             Кортеж (proxy_host, proxy_port, proxy_user, proxy_pass)
         """
-        proxy_port = str(random.randint(*config.PROXY_PORT_RANGE))
+        if self.profile:
+            # Профиль привязан к своему порту прокси
+            proxy_port = self.profile.proxy_port
+        elif self.proxy_port:
+            proxy_port = str(self.proxy_port)
+        else:
+            proxy_port = str(random.randint(*config.PROXY_PORT_RANGE))
         self.current_proxy = f"{config.PROXY_HOST}:{proxy_port}"
-        logger.info(f"Используем прокси: {self.current_proxy}")
+        logger.info(f"Используем прокси: {self.current_proxy}", extra=SAMPLED)
         return config.PROXY_HOST, proxy_port, config.PROXY_USER, config.PROXY_PASS
     
     def initialize_driver(self) -> None:
@@ -192,6 +214,10 @@ class GoogleRequester:
         Инициализирует и настраивает драйвер Chrome.
         """
         try:
+            # Файлы нового профиля создаются здесь, в потоке драйвера, а не в цикле событий
+            if self.profile:
+                self.profile.prepare()
+
             options = self.setup_chrome_options()
             
             # Подключаем прокси, если они включены
@@ -200,17 +226,20 @@ class GoogleRequester:
                 proxy_host, proxy_port, proxy_user, proxy_pass = self.get_rotating_proxy()
                 
                 # Создаем расширение для прокси
-                ext_path = self.create_proxy_extension(proxy_host, proxy_port, proxy_user, proxy_pass)
-                logger.info(f"Расширение для прокси создано в: {ext_path}")
+                if self.profile:
+                    ext_path = self.create_proxy_extension(proxy_host, proxy_port, proxy_user, proxy_pass,
+                                                           ext_dir=self.profile.extension_dir)
+                else:
+                    ext_path = self.create_proxy_extension(proxy_host, proxy_port, proxy_user, proxy_pass)
+                logger.info(f"Расширение для прокси создано в: {ext_path}", extra=SAMPLED)
                 
                 # Загружаем расширение для прокси
                 options.add_argument(f'--load-extension={ext_path}')
             
 
-            print(f"HEADLESS value: {config.HEADLESS}, type: {type(config.HEADLESS)}")
+            logger.debug(f"HEADLESS: {config.HEADLESS}")
             # Создаем экземпляр Chrome
             if config.HEADLESS:
-                print("HEADLESS  HEADLESS  HEADLESS  HEADLESS  HEADLESS")
                 options.headless = True
                 options.add_argument('--headless')  # Для Chrome 109+
                 options.add_argument('--disable-gpu')
@@ -220,16 +249,21 @@ class GoogleRequester:
                 options=options,
                 use_subprocess=True,
                 version_main=config.CHROME_VERSION,
-                headless=config.HEADLESS
+                headless=config.HEADLESS,
+                user_data_dir=self.profile.user_data_dir if self.profile else None
             )
             
+            # Передаем процессы браузера под контроль супервизора
+            if self.supervisor:
+                self.supervisor.register(self.driver)
+            
             # Устанавливаем тайм-аут загрузки страницы
             self.driver.set_page_load_timeout(config.TIMEOUT_PAGE_LOAD)
             
             # Скрываем факт автоматизации
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
             
-            logger.info("Драйвер Chrome успешно инициализирован")
+            logger.info("Драйвер Chrome успешно инициализирован", extra=SAMPLED)
         
         except Exception as e:
             logger.error(f"Ошибка при инициализации драйвера: {str(e)}")
@@ -240,25 +274,36 @@ class GoogleRequester:
     def close_driver(self) -> None:
         """Закрывает драйвер Chrome, если он открыт."""
         if self.driver:
+            driver = self.driver
             try:
-                self.driver.quit()
+                driver.quit()
                 self.driver = None
-                logger.info("Драйвер Chrome закрыт")
+                logger.info("Драйвер Chrome закрыт", extra=SAMPLED)
             except Exception as e:
                 logger.error(f"Ошибка при закрытии драйвера: {str(e)}")
+            finally:
+                # Добиваем процессы, которые могли остаться после неудачного quit()
+                if self.supervisor:
+                    self.supervisor.unregister(driver)
     
-    def accept_cookies(self) -> None:
-        """Принимает cookies, если появилось соответствующее окно."""
+    def accept_cookies(self) -> bool:
+        """
+        Принимает cookies, если появилось соответствующее окно.
+        
+        Returns:
+            bool: True, если окно было найдено и cookies приняты, False в противном случае
+        """
         try:
             for cookie_text in config.COOKIE_TEXTS:
                 buttons = self.driver.find_elements('xpath', f'//button[contains(text(), "{cookie_text}")]')
                 if buttons:
                     buttons[0].click()
-                    logger.info(f"Приняты куки (нажата кнопка '{cookie_text}')")
+                    logger.info(f"Приняты куки (нажата кнопка '{cookie_text}')", extra=SAMPLED)
                     time.sleep(random.uniform(1, 2))
-                    return
+                    return True
         except Exception as e:
             logger.warning(f"Ошибка при принятии куков: {e}")
+        return False
 
     def handle_location_dialog(self) -> bool:
         """
@@ -356,12 +401,17 @@ class GoogleRequester:
             
         # Добавляем параметры локации только если она указана
         if location:
-            uule_param = self.create_uule_parameter(location)
-            near_param = location.split(',')[0]
-            
-            search_params['uule'] = uule_param
-            search_params['near'] = near_param
-            logger.info(f"Задано местоположение: {location}")
+            target = resolve_location(location)
+            if target:
+                search_params['uule'] = target.uule
+                search_params['near'] = target.name
+                # Страна местоположения важнее gl, иначе Google смешивает выдачу двух стран
+                search_params['gl'] = target.gl
+                logger.info(f"Задано местоположение: {target.canonical_name}", extra=SAMPLED)
+            else:
+                logger.warning(f"Местоположение '{location}' не найдено в индексе геотаргетов, используем как есть")
+                search_params['uule'] = create_uule(location)
+                search_params['near'] = location.split(',')[0]
         
         # Формируем URL
         base_url = f"https://www.{domain}"
@@ -430,6 +480,23 @@ class GoogleRequester:
         
         return result
     
+    async def run_blocking(self, func, *args) -> Any:
+        """
+        Выполняет блокирующий вызов драйвера, не блокируя event loop.
+        Если задан выделенный воркер - все вызовы драйвера идут в его поток по порядку.
+        
+        Args:
+            func: Блокирующая функция
+            *args: Аргументы функции
+            
+        Returns:
+            Результат функции
+        """
+        if self.worker:
+            return await self.worker.run(func, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+    
     async def search_google_async(self, query: str, domain: str = None, 
                                 num: int = None, gl: Optional[str] = None, 
                                 hl: Optional[str] = None, lr: Optional[str] = None, 
@@ -462,6 +529,7 @@ class GoogleRequester:
         # Создаем результат со значениями по умолчанию
         result = {
             "success": False,
+            "captcha": False,
             "html": "",
             "error": "",
             "proxy": "",
@@ -470,12 +538,10 @@ class GoogleRequester:
             "screenshot_path": ""
         }
         
-        # Переносим блокирующие операции в отдельный поток, чтобы не блокировать event loop
-        loop = asyncio.get_event_loop()
-        
+        # Блокирующие операции выполняются в отдельном потоке (см. run_blocking)
         try:
             # Запускаем инициализацию браузера в отдельном потоке
-            await loop.run_in_executor(None, self.initialize_driver)
+            await self.run_blocking(self.initialize_driver)
             
             # # Сохраняем информацию о прокси и user-agent
             # if config.USE_PROXY:
@@ -493,22 +559,26 @@ class GoogleRequester:
                 cr=cr,
                 location=location
             )
-            logger.info(f"Поисковый URL: {search_url}")
+            logger.info(f"Поисковый URL: {search_url}", extra=SAMPLED)
             
             # Переходим по URL (блокирующая операция)
-            await loop.run_in_executor(None, lambda: self.driver.get(search_url))
+            await self.run_blocking(self.driver.get, search_url)
 
-            # Обрабатываем диалоговое окно геолокации
-            await loop.run_in_executor(None, self.handle_location_dialog)
+            # Диалоги уже обработаны в сохраненном профиле - пропускаем поиск кнопок
+            dialogs_handled = bool(self.profile and self.profile.dialogs_handled(domain))
             
-            # Принимаем cookies
-            await loop.run_in_executor(None, self.accept_cookies)
+            if not dialogs_handled:
+                # Обрабатываем диалоговое окно геолокации
+                await self.run_blocking(self.handle_location_dialog)
+                
+                # Принимаем cookies
+                await self.run_blocking(self.accept_cookies)
             
             # Ждем загрузку результатов
             await asyncio.sleep(random.uniform(*config.RANDOM_SLEEP_RANGE_MEDIUM))
             
             # Получаем исходный код страницы
-            page_source = await loop.run_in_executor(None, lambda: self.driver.page_source)
+            page_source = await self.run_blocking(lambda: self.driver.page_source)
             
             # Проверяем наличие капчи
             if self.check_for_captcha(page_source):
@@ -518,14 +588,14 @@ class GoogleRequester:
                 
                 # Сохраняем HTML и скриншот с капчей, если установлен соответствующий флаг
                 if config.SAVE_FAILED_RESULTS:
-                    save_result = await loop.run_in_executor(
-                        None, 
-                        lambda: self.save_results(query, page_source, False, error_msg, test_pause)
+                    save_result = await self.run_blocking(
+                        self.save_results, query, page_source, False, error_msg, test_pause
                     )
                     result.update(save_result)
                 
                 result.update({
                     "success": False,
+                    "captcha": True,
                     "error": error_msg,
                     "html": page_source 
                 })
@@ -533,11 +603,14 @@ class GoogleRequester:
                 return result
             
             # Сохраняем результаты
-            save_result = await loop.run_in_executor(
-                None, 
-                lambda: self.save_results(query, page_source, True, "", test_pause)
+            save_result = await self.run_blocking(
+                self.save_results, query, page_source, True, "", test_pause
             )
             
+            # Запоминаем в профиле, что диалоги для домена обработаны
+            if self.profile and not dialogs_handled:
+                self.profile.mark_dialogs_handled(domain)
+            
             # Обновляем результат
             result.update({
                 "success": True,
@@ -545,7 +618,7 @@ class GoogleRequester:
                 **save_result
             })
             
-            logger.info(f"Поисковый запрос '{query}' успешно выполнен")
+            logger.info(f"Поисковый запрос '{query}' успешно выполнен", extra=SAMPLED)
             
         except Exception as e:
             error_msg = f"Ошибка при выполнении запроса: {str(e)}"
@@ -555,7 +628,7 @@ class GoogleRequester:
         finally:
             # Закрываем браузер, если не задана пауза для тестирования
             if test_pause <= 0:
-                await loop.run_in_executor(None, self.close_driver)
+                await self.run_blocking(self.close_driver)
         
         return result
 
@@ -0,0 +1,224 @@
+"""
+Версионированные правила парсинга выдачи.
+Селекторы DekstopScrape хранятся в файлах rules/<версия>.json и один раз
+компилируются (soupsieve) в кэш селекторов. Правила перезагружаются без
+перезапуска сервиса атомарной заменой набора версий; несколько версий могут
+работать одновременно на долях живого трафика для сравнения успешности.
+"""
+
+import glob
+import json
+import os
+import random
+import logging
+from typing import Dict, Any, Iterable, Optional
+
+import soupsieve
+
+import config
+
+logger = logging.getLogger('google_requester')
+
+# Селекторы основных блоков, которые использует DekstopScrape (page_parser.py):
+# без них страница не разбирается, поэтому файл правил обязан их задать
+REQUIRED_SELECTORS = {
+    "organic": ("item", "exclude", "link", "title", "snippet", "sitelinks", "sitelinks_table", "sitelink"),
+    "ads": ("item", "source", "link", "title", "description", "sitelinks", "sitelink"),
+}
+
+# Селекторы дополнительных блоков (FEATURE_EXTRACTORS в page_parser.py). Версия правил
+# задает их все или явно отказывается от блока списком "without_features" - тогда
+# этот блок ее правилами не парсится
+FEATURE_SELECTORS = {
+    "people_also_ask": ("item", "question", "snippet", "link"),
+    "local_pack": ("item", "title", "details", "website", "rating", "reviews"),
+    "top_stories": ("item", "title", "source", "date"),
+    "related_searches": ("item", "query"),
+    "knowledge_panel": ("panel", "source", "attribute", "attribute_label", "attribute_value",
+                        "title", "type", "description"),
+}
+
+
+class RuleSet:
+    """
+    Одна версия правил: скомпилированные селекторы и статистика парсинга.
+    """
+
+    def __init__(self, version: str, selectors: Dict[str, Dict[str, str]], description: str = "",
+                 traffic_share: float = 0.0, without_features: Iterable[str] = ()):
+        """
+        Args:
+            version: Версия правил
+            selectors: Блок выдачи -> имя селектора -> CSS-селектор
+            description: Описание версии
+            traffic_share: Доля трафика, которая парсится этой версией (кроме версии по умолчанию)
+            without_features: Дополнительные блоки, которые эта версия не парсит
+
+        Raises:
+            ValueError: если нет обязательного селектора или селектор не компилируется
+        """
+        self.version = version
+        self.description = description
+        self.traffic_share = traffic_share
+        self.selectors = selectors
+        self.without_features = set(without_features)
+        self._validate()
+        self._compiled = {}
+        for block, names in selectors.items():
+            for name, selector in names.items():
+                try:
+                    self._compiled[f"{block}.{name}"] = soupsieve.compile(selector)
+                except Exception as e:
+                    raise ValueError(f"Некорректный селектор {block}.{name} в правилах {version}: {e}")
+        self.counters = {"parses": 0, "with_organic": 0, "organic_items": 0, "ads_items": 0, "errors": 0}
+
+    def _validate(self) -> None:
+        """Проверяет, что заданы все селекторы, которые использует парсер."""
+        unknown = self.without_features - set(FEATURE_SELECTORS)
+        if unknown:
+            raise ValueError(f"Неизвестные блоки в without_features правил {self.version}: {', '.join(sorted(unknown))}")
+        required = dict(REQUIRED_SELECTORS)
+        required.update(
+            (block, names) for block, names in FEATURE_SELECTORS.items() if block not in self.without_features
+        )
+        missing = [
+            f"{block}.{name}" for block, names in required.items()
+            for name in names if name not in self.selectors.get(block, {})
+        ]
+        if missing:
+            raise ValueError(f"В правилах {self.version} нет селекторов: {', '.join(missing)}")
+
+    def supports(self, feature: str) -> bool:
+        """Парсит ли эта версия правил дополнительный блок feature."""
+        return feature not in self.without_features
+
+    @classmethod
+    def from_file(cls, path: str) -> "RuleSet":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        version = data.get("version") or os.path.splitext(os.path.basename(path))[0]
+        return cls(version, data["selectors"], data.get("description", ""),
+                   float(data.get("traffic_share", 0.0)), data.get("without_features", ()))
+
+    def select(self, tag, name: str):
+        """Все элементы внутри tag по селектору name (например, "organic.item")."""
+        return self._compiled[name].select(tag)
+
+    def select_one(self, tag, name: str):
+        """Первый элемент внутри tag по селектору name или None."""
+        return self._compiled[name].select_one(tag)
+
+    def record(self, organic_count: int, ads_count: int, error: bool = False) -> None:
+        """Учитывает результат парсинга страницы этой версией правил."""
+        self.counters["parses"] += 1
+        if error:
+            self.counters["errors"] += 1
+            return
+        if organic_count:
+            self.counters["with_organic"] += 1
+        self.counters["organic_items"] += organic_count
+        self.counters["ads_items"] += ads_count
+
+    def stats(self) -> Dict[str, Any]:
+        parses = self.counters["parses"]
+        return {
+            "description": self.description,
+            "traffic_share": self.traffic_share,
+            "selectors": len(self._compiled),
+            "without_features": sorted(self.without_features),
+            **self.counters,
+            # Доля страниц, на которых найдены органические результаты
+            "success_rate": round(self.counters["with_organic"] / parses, 4) if parses else None,
+            "avg_organic": round(self.counters["organic_items"] / parses, 2) if parses else None,
+        }
+
+
+class RuleRegistry:
+    """
+    Набор загруженных версий правил.
+    Состояние заменяется целиком одним присваиванием, поэтому парсинг,
+    начатый до перезагрузки, доработает на старых правилах.
+    """
+
+    def __init__(self, folder: str = None, default_version: str = None):
+        """
+        Args:
+            folder: Папка с файлами правил
+            default_version: Версия, которая обрабатывает трафик, не отданный другим версиям
+        """
+        self.folder = folder or config.PARSER_RULES_FOLDER
+        self.default_version = default_version or config.PARSER_RULES_DEFAULT
+        self._versions: Dict[str, RuleSet] = {}
+        self.reload()
+
+    def reload(self) -> Dict[str, Any]:
+        """
+        Перечитывает и компилирует все файлы правил.
+        Если хоть один файл некорректен, текущие правила остаются без изменений.
+
+        Raises:
+            ValueError: если файлы правил не читаются или не содержат версию по умолчанию
+        """
+        versions = {}
+        for path in sorted(glob.glob(os.path.join(self.folder, "*.json"))):
+            try:
+                rules = RuleSet.from_file(path)
+            except Exception as e:
+                raise ValueError(f"Не удалось загрузить правила {path}: {e}")
+            if rules.version in versions:
+                raise ValueError(f"Версия правил {rules.version} задана в нескольких файлах")
+            # Статистика версии сохраняется между перезагрузками
+            previous = self._versions.get(rules.version)
+            if previous:
+                rules.counters = previous.counters
+            versions[rules.version] = rules
+
+        if self.default_version not in versions:
+            raise ValueError(f"Нет правил версии по умолчанию {self.default_version} в {self.folder}")
+
+        self._versions = versions
+        logger.info(f"Загружены правила парсинга: {', '.join(versions)} (по умолчанию {self.default_version})")
+        return self.stats()
+
+    def get(self, version: Optional[str] = None) -> RuleSet:
+        """
+        Возвращает правила для разбора страницы.
+
+        Args:
+            version: Конкретная версия (None - по долям трафика)
+
+        Raises:
+            KeyError: если версия не загружена
+        """
+        versions = self._versions
+        if version:
+            return versions[version]
+        point = random.random()
+        for rules in versions.values():
+            if rules.version == self.default_version or rules.traffic_share <= 0:
+                continue
+            if point < rules.traffic_share:
+                return rules
+            point -= rules.traffic_share
+        return versions[self.default_version]
+
+    def set_traffic_share(self, version: str, share: float) -> None:
+        """Задает долю трафика версии (до следующей перезагрузки файлов)."""
+        if version not in self._versions:
+            raise KeyError(version)
+        if not 0 <= share <= 1:
+            raise ValueError("Доля трафика должна быть от 0 до 1")
+        self._versions[version].traffic_share = share
+
+    def set_default(self, version: str) -> None:
+        """Делает версию основной (например, после сравнения на живом трафике)."""
+        if version not in self._versions:
+            raise KeyError(version)
+        self.default_version = version
+        self._versions[version].traffic_share = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default_version": self.default_version,
+            "versions": {version: rules.stats() for version, rules in self._versions.items()},
+        }
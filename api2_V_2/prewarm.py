@@ -0,0 +1,174 @@
+"""
+Прогрев кэша популярных запросов в простое.
+Движок запоминает параметры запросов /search (счетчики с экспоненциальным
+затуханием) и, когда есть свободные браузеры, а контроль частоты и circuit
+breaker-ы это позволяют, обновляет кэш популярных запросов незадолго до
+истечения срока жизни записей.
+"""
+
+import asyncio
+import time
+import logging
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import config
+from page_parser import DekstopScrape
+from result_cache import search_key
+from log_setup import request_id_var
+
+logger = logging.getLogger('google_requester')
+
+
+class PrewarmEngine:
+    """
+    Обновляет записи кэша популярных запросов, пока браузеры простаивают.
+    """
+
+    def __init__(self, pipeline, cache):
+        """
+        Args:
+            pipeline: SearchPipeline
+            cache: ResultCache
+        """
+        self.pipeline = pipeline
+        self.cache = cache
+        # Ключ кэша -> {"params", "include", "score", "updated", "retry_at"}
+        self._hot: Dict[Tuple, Dict[str, Any]] = {}
+        self._in_flight = set()
+        self._running = set()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "refreshed": 0, "failed": 0,
+            "skipped_no_capacity": 0, "skipped_rate": 0, "skipped_breaker": 0,
+        }
+
+    def _decayed(self, item: Dict[str, Any], now: float) -> float:
+        """Счетчик запроса с учетом затухания (период полураспада PREWARM_HALF_LIFE)."""
+        return item["score"] * 0.5 ** ((now - item["updated"]) / config.PREWARM_HALF_LIFE)
+
+    def observe(self, params: Dict[str, Any], include: Optional[Iterable[str]] = None) -> None:
+        """Учитывает запрос /search (вызывается на каждый запрос, в том числе из кэша)."""
+        if not config.PREWARM_ENABLED:
+            return
+        now = time.time()
+        include = sorted(include or ())
+        key = search_key(params, include)
+        item = self._hot.get(key)
+        if item is None:
+            item = self._hot[key] = {"params": dict(params), "include": include, "score": 0.0, "updated": now}
+        item["score"] = self._decayed(item, now) + 1
+        item["updated"] = now
+
+        if len(self._hot) > config.PREWARM_MAX_TRACKED:
+            # Забываем самую холодную половину запросов
+            ranked = sorted(self._hot.items(), key=lambda kv: self._decayed(kv[1], now))
+            for old_key, _ in ranked[:len(ranked) // 2]:
+                self._hot.pop(old_key, None)
+
+    def hot(self, now: float = None) -> List[Tuple[Tuple, Dict[str, Any], float]]:
+        """Популярные запросы (по убыванию счетчика)."""
+        now = now or time.time()
+        ranked = [
+            (key, item, self._decayed(item, now)) for key, item in self._hot.items()
+        ]
+        ranked = [entry for entry in ranked if entry[2] >= config.PREWARM_MIN_SCORE]
+        ranked.sort(key=lambda entry: entry[2], reverse=True)
+        return ranked[:config.PREWARM_MAX_KEYS]
+
+    def _due(self, item: Dict[str, Any], now: float) -> bool:
+        """Нужно ли обновить запись кэша (нет записи или она скоро истечет)."""
+        if item.get("retry_at", 0) > now:
+            return False
+        entry = self.cache.peek(item["params"], item["include"])
+        return entry is None or entry["expires_at"] - now <= config.PREWARM_LEAD
+
+    def _tick(self) -> None:
+        """Запускает обновление популярных запросов, пока есть свободные ресурсы."""
+        now = time.time()
+        proxy_host = config.PROXY_HOST if config.USE_PROXY else None
+        for key, item, _ in self.hot(now):
+            if key in self._in_flight or not self._due(item, now):
+                continue
+            # Оставляем часть браузеров для живого трафика
+            # (запущенные прогревы могли еще не занять свой браузер, поэтому вычитаем их)
+            free = self.pipeline.worker_pool.free_count - len(self._in_flight)
+            if free <= config.PREWARM_RESERVE or len(self._in_flight) >= config.PREWARM_CONCURRENCY:
+                self.counters["skipped_no_capacity"] += 1
+                return
+            domain = item["params"].get("domain") or config.DEFAULT_SEARCH_DOMAIN
+            if not self.pipeline.breakers.is_closed(domain, proxy_host):
+                self.counters["skipped_breaker"] += 1
+                continue
+            # Проверяем порт, через который действительно пойдет запрос
+            proxy_port = self.pipeline.next_port()
+            if not self.pipeline.rate_controller.has_capacity(domain, proxy_port):
+                self.counters["skipped_rate"] += 1
+                continue
+            self._in_flight.add(key)
+            task = asyncio.ensure_future(self._refresh(key, item, proxy_port))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _refresh(self, key: Tuple, item: Dict[str, Any], proxy_port: str) -> None:
+        """Выполняет запрос (через проверенный в _tick порт) и обновляет запись кэша."""
+        params = item["params"]
+        request_id_var.set(f"prewarm-{abs(hash(key)) % 10 ** 8}")
+        try:
+            result = await self.pipeline.fetch(**params, proxy_port=proxy_port)
+            if not result["success"]:
+                raise RuntimeError(result["error"])
+            parsed_data = await DekstopScrape().make_json(result["html"], include=item["include"])
+            if parsed_data is None:
+                raise RuntimeError("Ошибка при парсинге результатов")
+            self.cache.put(params, item["include"], parsed_data)
+            self.counters["refreshed"] += 1
+        except Exception as e:
+            self.counters["failed"] += 1
+            # Не повторяем неудачный прогрев на каждой проверке
+            item["retry_at"] = time.time() + config.PREWARM_RETRY_DELAY
+            logger.warning(f"Прогрев '{params.get('query')}' не выполнен: {e}")
+        finally:
+            self._in_flight.discard(key)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"Ошибка прогрева кэша: {e}")
+            await asyncio.sleep(config.PREWARM_TICK)
+
+    def start(self) -> None:
+        """Запускает прогрев (вызывается при старте сервиса)."""
+        if config.PREWARM_ENABLED and config.CACHE_TTL > 0 and self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    def stop(self) -> None:
+        """Останавливает прогрев и выполняющиеся запросы."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Возвращает популярные запросы, время до истечения их записей в кэше и счетчики."""
+        now = time.time()
+        hot = self.hot(now)
+        top = []
+        for _, item, score in hot[:20]:
+            entry = self.cache.peek(item["params"], item["include"])
+            top.append({
+                "params": item["params"],
+                "include": item["include"],
+                "score": round(score, 2),
+                "expires_in": round(entry["expires_at"] - now, 1) if entry else None,
+            })
+        return {
+            "enabled": config.PREWARM_ENABLED and self._task is not None,
+            "tracked": len(self._hot),
+            "hot": len(hot),
+            "in_flight": len(self._in_flight),
+            **self.counters,
+            "top": top,
+        }
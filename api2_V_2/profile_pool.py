@@ -0,0 +1,235 @@
+"""
+Пул постоянных профилей Chrome.
+Каждый профиль привязан к своему порту прокси и хранит cookies, local storage
+и отметки о уже обработанных диалогах между запусками.
+"""
+
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import logging
+from typing import Dict, Any, Optional
+
+import config
+
+logger = logging.getLogger('google_requester')
+
+
+class BrowserProfile:
+    """
+    Изолированный профиль Chrome, привязанный к одному прокси-порту.
+    """
+
+    def __init__(self, profile_id: str, path: str, state: Dict[str, Any], fresh: bool = False):
+        self.profile_id = profile_id
+        self.path = path
+        self.state = state
+        # Новый профиль: файлы на диске создаются при первом использовании (см. prepare)
+        self.fresh = fresh
+
+    @property
+    def user_data_dir(self) -> str:
+        """Директория пользовательских данных Chrome."""
+        return os.path.abspath(os.path.join(self.path, "chrome"))
+
+    @property
+    def extension_dir(self) -> str:
+        """Директория расширения для авторизации прокси этого профиля."""
+        return os.path.join(self.path, "proxy_auth_extension")
+
+    @property
+    def proxy_port(self) -> str:
+        return str(self.state["proxy_port"])
+
+    def dialogs_handled(self, domain: str) -> bool:
+        """
+        Проверяет, сохранено ли в профиле состояние диалогов для домена.
+
+        Args:
+            domain: Домен Google
+
+        Returns:
+            True, если cookies и диалог геолокации для домена уже обработаны
+        """
+        return bool(self.state["dialogs"].get(domain))
+
+    def mark_dialogs_handled(self, domain: str) -> None:
+        """Отмечает, что диалоги для домена обработаны и сохранены в профиле."""
+        self.state["dialogs"][domain] = int(time.time())
+
+    def prepare(self) -> None:
+        """
+        Для нового профиля удаляет оставшиеся от прежнего профиля с тем же id
+        данные и сохраняет состояние. Дисковая операция: вызывается из потока
+        драйвера (GoogleRequester.initialize_driver) или из пула потоков.
+        """
+        if not self.fresh:
+            return
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+        self.save()
+        self.fresh = False
+        logger.info(f"Создан профиль {self.profile_id} (порт прокси {self.proxy_port})")
+
+    def save(self) -> None:
+        """Сохраняет состояние профиля на диск."""
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, "state.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, os.path.join(self.path, "state.json"))
+
+
+class ProfilePool:
+    """
+    Пул постоянных профилей. Профиль одновременно используется только одним
+    браузером; профиль, который начал получать капчи, пересоздается с новым
+    прокси-портом.
+    """
+
+    def __init__(self, root: str = None, size: int = None, captcha_limit: int = None):
+        """
+        Инициализация пула и загрузка профилей, сохраненных на диске.
+
+        Args:
+            root: Директория для хранения профилей
+            size: Максимальное количество профилей
+            captcha_limit: Количество капч подряд, после которого профиль ротируется
+        """
+        self.root = root or config.PROFILES_FOLDER
+        self.size = size or config.PROFILE_POOL_SIZE
+        self.captcha_limit = captcha_limit or config.PROFILE_CAPTCHA_LIMIT
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, BrowserProfile] = {}
+        self._busy = set()
+        self.rotations = 0
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        """Загружает профили из директории пула."""
+        for profile_id in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, profile_id)
+            state_path = os.path.join(path, "state.json")
+            if not os.path.isfile(state_path):
+                continue
+            try:
+                with open(state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                self._profiles[profile_id] = BrowserProfile(profile_id, path, state)
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить профиль {profile_id}: {e}")
+        if self._profiles:
+            logger.info(f"Загружено профилей: {len(self._profiles)}")
+
+    def _new_profile(self, profile_id: str) -> BrowserProfile:
+        """Создает в памяти новый профиль со случайным прокси-портом (файлы - см. BrowserProfile.prepare)."""
+        state = {
+            "proxy_port": random.randint(*config.PROXY_PORT_RANGE),
+            "created_at": int(time.time()),
+            "last_used": 0,
+            "uses": 0,
+            "captchas": 0,
+            "dialogs": {},
+        }
+        profile = BrowserProfile(profile_id, os.path.join(self.root, profile_id), state, fresh=True)
+        self._profiles[profile_id] = profile
+        return profile
+
+    def _pick_free(self, exclude_port: Optional[str], prefer_port: Optional[str] = None) -> Optional[BrowserProfile]:
+        """
+        Свободный профиль (вызывается под блокировкой): с портом prefer_port,
+        если такой свободен, иначе тот, что дольше всех не использовался.
+        """
+        free = [
+            p for pid, p in self._profiles.items()
+            if pid not in self._busy and (exclude_port is None or p.proxy_port != exclude_port)
+        ]
+        preferred = [p for p in free if p.proxy_port == prefer_port]
+        return min(preferred or free, key=lambda p: p.state["last_used"]) if free else None
+
+    def peek_port(self) -> Optional[str]:
+        """
+        Прокси-порт профиля, который сейчас выдал бы acquire().
+
+        Returns:
+            Порт или None, если свободных профилей нет (будет создан новый или использован временный)
+        """
+        with self._lock:
+            profile = self._pick_free(None)
+        return profile.proxy_port if profile else None
+
+    def acquire(self, exclude_port: Optional[str] = None,
+                prefer_port: Optional[str] = None) -> Optional[BrowserProfile]:
+        """
+        Выдает свободный профиль (давно не использованный в первую очередь).
+        Не обращается к диску: файлы нового профиля создаются в потоке драйвера.
+
+        Args:
+            exclude_port: Не выдавать профили, привязанные к этому прокси-порту
+            prefer_port: Выдать профиль с этим портом, если он свободен (см. peek_port)
+
+        Returns:
+            Профиль или None, если все профили заняты
+        """
+        with self._lock:
+            profile = self._pick_free(exclude_port, prefer_port)
+            if profile is None:
+                if len(self._profiles) >= self.size:
+                    return None
+                profile_id = next(
+                    f"profile_{i}" for i in range(self.size * 2)
+                    if f"profile_{i}" not in self._profiles
+                )
+                profile = self._new_profile(profile_id)
+            self._busy.add(profile.profile_id)
+        return profile
+
+    def release(self, profile: BrowserProfile, captcha: bool = False) -> None:
+        """
+        Возвращает профиль в пул и сохраняет его состояние.
+        Выполняет дисковые операции (сохранение, удаление профиля при ротации),
+        поэтому из асинхронного кода вызывается в пуле потоков.
+
+        Args:
+            profile: Профиль
+            captcha: Была ли получена капча в последнем запросе
+        """
+        with self._lock:
+            profile.state["uses"] += 1
+            profile.state["last_used"] = int(time.time())
+            profile.state["captchas"] = profile.state["captchas"] + 1 if captcha else 0
+
+            rotated = None
+            if profile.state["captchas"] >= self.captcha_limit:
+                logger.warning(f"Профиль {profile.profile_id} получает капчи, ротируем его")
+                rotated = self._new_profile(profile.profile_id)
+                self.rotations += 1
+
+        # Профиль остается занятым, пока его файлы не записаны
+        try:
+            if rotated:
+                rotated.prepare()
+            else:
+                # Если браузер так и не был запущен, файлы нового профиля еще не созданы
+                profile.prepare()
+                profile.save()
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить профиль {profile.profile_id}: {e}")
+        finally:
+            with self._lock:
+                self._busy.discard(profile.profile_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает состояние пула профилей."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "profiles": len(self._profiles),
+                "busy": len(self._busy),
+                "rotations": self.rotations,
+            }
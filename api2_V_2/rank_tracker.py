@@ -0,0 +1,215 @@
+"""
+Отслеживание позиций (rank tracking).
+Хранит органическую выдачу по каждому ключевому запросу в SQLite и
+возвращает только изменения относительно предыдущего снимка.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+import config
+
+logger = logging.getLogger('google_requester')
+
+# Параметры поиска, которые определяют ключевой запрос
+KEYWORD_PARAMS = ('query', 'domain', 'num', 'gl', 'hl', 'lr', 'cr', 'location')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keywords (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    query TEXT NOT NULL,
+    params TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    keyword_id INTEGER NOT NULL REFERENCES keywords(id),
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_keyword ON snapshots(keyword_id, created_at);
+CREATE TABLE IF NOT EXISTS positions (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    keyword_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    result_domain TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_positions_snapshot ON positions(snapshot_id);
+CREATE INDEX IF NOT EXISTS idx_positions_domain ON positions(result_domain, keyword_id, created_at);
+"""
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def normalize_domain(domain: str) -> str:
+    """Приводит домен к виду для сравнения: нижний регистр, без "www." ("www.Example.com" -> "example.com")."""
+    domain = (domain or '').strip().lower().rstrip('.')
+    return domain[4:] if domain.startswith('www.') else domain
+
+
+def _domain_positions(positions: Dict[str, Tuple[int, str]]) -> Dict[str, int]:
+    """Лучшая (минимальная) позиция каждого домена."""
+    best = {}
+    for position, domain in positions.values():
+        if domain not in best or position < best[domain]:
+            best[domain] = position
+    return best
+
+
+def _diff(previous: Dict[str, int], current: Dict[str, int], name: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Сравнивает позиции двух снимков.
+
+    Args:
+        previous: Ключ (URL или домен) -> позиция в предыдущем снимке
+        current: Ключ -> позиция в текущем снимке
+        name: Название ключа в ответе ('url' или 'domain')
+
+    Returns:
+        Словарь с новыми, выпавшими и переместившимися ключами
+    """
+    new = [{name: key, 'position': pos} for key, pos in current.items() if key not in previous]
+    dropped = [{name: key, 'previous_position': pos} for key, pos in previous.items() if key not in current]
+    moved = [
+        {name: key, 'previous_position': previous[key], 'position': pos, 'change': previous[key] - pos}
+        for key, pos in current.items()
+        if key in previous and previous[key] != pos
+    ]
+    return {
+        'new': sorted(new, key=lambda x: x['position']),
+        'dropped': sorted(dropped, key=lambda x: x['previous_position']),
+        'moved': sorted(moved, key=lambda x: x['position']),
+    }
+
+
+class RankTracker:
+    """
+    Хранилище истории позиций на SQLite.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: Путь к файлу базы данных
+        """
+        self.path = path or config.HISTORY_DB
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def keyword_params(params: Dict[str, Any]) -> Dict[str, Any]:
+        """Оставляет только параметры, определяющие ключевой запрос."""
+        return {name: params.get(name) for name in KEYWORD_PARAMS}
+
+    def _keyword_id(self, params: Dict[str, Any]) -> int:
+        keyword = self.keyword_params(params)
+        key = json.dumps(keyword, sort_keys=True, ensure_ascii=False)
+        row = self._conn.execute('SELECT id FROM keywords WHERE key = ?', (key,)).fetchone()
+        if row:
+            return row['id']
+        cursor = self._conn.execute(
+            'INSERT INTO keywords (key, query, params) VALUES (?, ?, ?)',
+            (key, keyword['query'], json.dumps(keyword, ensure_ascii=False))
+        )
+        return cursor.lastrowid
+
+    def track(self, params: Dict[str, Any], organic: List[Any]) -> Dict[str, Any]:
+        """
+        Сохраняет снимок органической выдачи и возвращает изменения.
+
+        Args:
+            params: Параметры поиска
+            organic: Органические результаты (OrganicResult)
+
+        Returns:
+            Словарь с изменениями по URL и по доменам
+        """
+        now = time.time()
+        current = {item.link: (int(item.position), normalize_domain(item.domain)) for item in organic}
+
+        with self._lock, self._conn:
+            keyword_id = self._keyword_id(params)
+            last = self._conn.execute(
+                'SELECT id, created_at FROM snapshots WHERE keyword_id = ? ORDER BY created_at DESC LIMIT 1',
+                (keyword_id,)
+            ).fetchone()
+            previous = {}
+            if last:
+                rows = self._conn.execute(
+                    'SELECT url, position, result_domain FROM positions WHERE snapshot_id = ?', (last['id'],)
+                )
+                previous = {row['url']: (row['position'], normalize_domain(row['result_domain'])) for row in rows}
+
+            snapshot_id = self._conn.execute(
+                'INSERT INTO snapshots (keyword_id, created_at) VALUES (?, ?)', (keyword_id, now)
+            ).lastrowid
+            self._conn.executemany(
+                'INSERT INTO positions (snapshot_id, keyword_id, position, url, result_domain, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(snapshot_id, keyword_id, pos, url, domain, now) for url, (pos, domain) in current.items()]
+            )
+
+        return {
+            'first_snapshot': last is None,
+            'previous_snapshot_at': _iso(last['created_at']) if last else None,
+            'snapshot_at': _iso(now),
+            'urls': _diff({url: pos for url, (pos, _) in previous.items()},
+                          {url: pos for url, (pos, _) in current.items()}, 'url'),
+            'domains': _diff(_domain_positions(previous), _domain_positions(current), 'domain'),
+        }
+
+    def history(self, domain: str, query: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Возвращает историю позиций домена.
+
+        Args:
+            domain: Домен сайта в выдаче (например, example.com; "www." не учитывается)
+            query: Ограничить историю одним поисковым запросом
+            limit: Максимальное количество записей
+
+        Returns:
+            Список записей (новые первыми)
+        """
+        sql = (
+            'SELECT k.query, k.params, p.position, p.url, p.created_at '
+            'FROM positions p JOIN keywords k ON k.id = p.keyword_id '
+            'WHERE p.result_domain = ?'
+        )
+        args: List[Any] = [normalize_domain(domain)]
+        if query:
+            sql += ' AND k.query = ?'
+            args.append(query)
+        sql += ' ORDER BY p.created_at DESC, p.position LIMIT ?'
+        args.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [
+            {
+                'query': row['query'],
+                'params': json.loads(row['params']),
+                'position': row['position'],
+                'url': row['url'],
+                'checked_at': _iso(row['created_at']),
+            }
+            for row in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
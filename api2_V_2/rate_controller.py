@@ -0,0 +1,182 @@
+"""
+Адаптивный (AIMD) контроль частоты запросов к Google.
+Частота растет аддитивно, пока запросы успешны, и уменьшается мультипликативно,
+когда растет доля капч и ошибок. Частота ведется отдельно для каждого
+прокси-порта и для каждого домена Google.
+"""
+
+import asyncio
+import random
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, Iterable, Optional
+
+import config
+
+logger = logging.getLogger('google_requester')
+
+SUCCESS = "success"
+CAPTCHA = "captcha"
+ERROR = "error"
+
+
+class _RateState:
+    """Текущая частота и история исходов для одного ключа."""
+
+    def __init__(self, rate: float, window: int):
+        self.rate = rate
+        self.next_time = 0.0
+        self.outcomes = deque(maxlen=window)
+        self.last_decrease = 0.0
+        self.totals = {SUCCESS: 0, CAPTCHA: 0, ERROR: 0}
+
+    def failure_ratio(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for o in self.outcomes if o != SUCCESS) / len(self.outcomes)
+
+
+class AIMDLimiter:
+    """
+    AIMD-ограничитель частоты для группы ключей (например, для всех доменов).
+    """
+
+    def __init__(self, initial_rate: float, max_rate: float, min_rate: float = None,
+                 increase_step: float = None, decrease_factor: float = None,
+                 window: int = None, failure_threshold: float = None,
+                 cooldown: float = None):
+        """
+        Args:
+            initial_rate: Начальная частота (запросов в секунду)
+            max_rate: Максимальная частота
+            min_rate: Минимальная частота
+            increase_step: Аддитивный шаг увеличения после успешного запроса
+            decrease_factor: Множитель уменьшения при всплеске капч/ошибок
+            window: Количество последних исходов для оценки доли неудач
+            failure_threshold: Доля неудач, при которой частота уменьшается
+            cooldown: Минимальный интервал между уменьшениями частоты (сек.)
+        """
+        self.initial_rate = initial_rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate or config.RATE_MIN
+        self.increase_step = increase_step or config.RATE_INCREASE_STEP
+        self.decrease_factor = decrease_factor or config.RATE_DECREASE_FACTOR
+        self.window = window or config.RATE_WINDOW
+        self.failure_threshold = failure_threshold or config.RATE_FAILURE_THRESHOLD
+        self.cooldown = cooldown if cooldown is not None else config.RATE_DECREASE_COOLDOWN
+        self._states: Dict[str, _RateState] = {}
+
+    def state(self, key: str) -> _RateState:
+        if key not in self._states:
+            self._states[key] = _RateState(self.initial_rate, self.window)
+        return self._states[key]
+
+    def next_time(self, key: str) -> float:
+        """Время, начиная с которого по ключу можно отправить запрос."""
+        state = self._states.get(key)
+        return state.next_time if state else 0.0
+
+    def reserve(self, key: str, start: float) -> None:
+        """Занимает слот, начинающийся в момент start."""
+        state = self.state(key)
+        state.next_time = start + 1.0 / state.rate
+
+    def record(self, key: str, outcome: str) -> None:
+        """
+        Учитывает исход запроса и корректирует частоту.
+
+        Args:
+            key: Ключ (домен или прокси-порт)
+            outcome: SUCCESS, CAPTCHA или ERROR
+        """
+        state = self.state(key)
+        state.outcomes.append(outcome)
+        state.totals[outcome] += 1
+
+        now = time.monotonic()
+        if state.failure_ratio() >= self.failure_threshold:
+            if outcome != SUCCESS and now - state.last_decrease >= self.cooldown:
+                old_rate = state.rate
+                state.rate = max(self.min_rate, state.rate * self.decrease_factor)
+                state.last_decrease = now
+                logger.warning(f"Частота для {key} снижена: {old_rate:.3f} -> {state.rate:.3f} req/s")
+        elif outcome == SUCCESS:
+            state.rate = min(self.max_rate, state.rate + self.increase_step)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Возвращает текущие частоты по всем ключам."""
+        return {
+            key: {
+                "rate": round(state.rate, 4),
+                "failure_ratio": round(state.failure_ratio(), 3),
+                **state.totals,
+            }
+            for key, state in self._states.items()
+        }
+
+
+class RateController:
+    """
+    Контроллер частоты запросов по прокси-портам и доменам Google.
+    Запрос отправляется, только когда это разрешают оба ограничителя.
+    """
+
+    def __init__(self):
+        self.domains = AIMDLimiter(config.RATE_DOMAIN_INITIAL, config.RATE_DOMAIN_MAX)
+        self.proxies = AIMDLimiter(config.RATE_PROXY_INITIAL, config.RATE_PROXY_MAX)
+
+    def pick_port(self, candidates: Optional[Iterable[int]] = None, exclude: Optional[str] = None) -> str:
+        """
+        Выбирает прокси-порт, который освободится раньше других.
+
+        Args:
+            candidates: Порты для выбора (по умолчанию - случайная выборка из диапазона)
+            exclude: Порт, который нельзя выбирать
+
+        Returns:
+            Номер порта в виде строки
+        """
+        if candidates is None:
+            candidates = [random.randint(*config.PROXY_PORT_RANGE) for _ in range(config.RATE_PORT_CHOICES)]
+        ports = [str(port) for port in candidates if str(port) != exclude]
+        if not ports:
+            ports = [str(port) for port in candidates]
+        return min(ports, key=self.proxies.next_time)
+
+    async def acquire(self, domain: str, proxy_port: str) -> float:
+        """
+        Ожидает слот для запроса к домену через прокси-порт.
+
+        Returns:
+            Время ожидания в секундах
+        """
+        now = time.monotonic()
+        start = max(now, self.domains.next_time(domain), self.proxies.next_time(proxy_port))
+        self.domains.reserve(domain, start)
+        self.proxies.reserve(proxy_port, start)
+
+        delay = start - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def has_capacity(self, domain: str, proxy_port: str) -> bool:
+        """
+        Проверяет, можно ли отправить запрос к домену через прокси-порт без ожидания
+        (нет очереди ни по домену, ни по порту).
+        """
+        now = time.monotonic()
+        return self.domains.next_time(domain) <= now and self.proxies.next_time(proxy_port) <= now
+
+    def record(self, domain: str, proxy_port: str, outcome: str) -> None:
+        """Учитывает исход запроса в обоих ограничителях."""
+        self.domains.record(domain, outcome)
+        self.proxies.record(proxy_port, outcome)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Возвращает текущие частоты по доменам и прокси-портам."""
+        return {
+            "domains": self.domains.snapshot(),
+            "proxies": self.proxies.snapshot(),
+        }
@@ -0,0 +1,86 @@
+"""
+Быстрая сериализация ответов API (orjson) и сжатие gzip/brotli
+по заголовку Accept-Encoding.
+"""
+
+import gzip
+from typing import Any, Dict
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+import config
+
+try:
+    import brotli
+except ImportError:  # brotli не установлен - отдаем только gzip
+    brotli = None
+
+
+def dumps(content: Any, indent: bool = False) -> bytes:
+    """Сериализует ответ в JSON (dataclass-модели поддерживаются напрямую)."""
+    option = orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(content, option=option)
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """
+    Разбирает заголовок Accept-Encoding.
+
+    Returns:
+        Словарь: кодировка -> вес q
+    """
+    encodings = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+
+def choose_encoding(header: str) -> str:
+    """Выбирает кодировку сжатия: brotli предпочтительнее gzip."""
+    encodings = accepted_encodings(header or '')
+    candidates = ['br', 'gzip'] if brotli else ['gzip']
+    for name in candidates:
+        if encodings.get(name, encodings.get('*', 0)) > 0:
+            return name
+    return 'identity'
+
+
+def json_response(request: Request, content: Any, status_code: int = 200) -> Response:
+    """
+    Возвращает JSON-ответ, сжатый согласно Accept-Encoding клиента.
+
+    Args:
+        request: Запрос клиента
+        content: Данные ответа
+        status_code: HTTP-код ответа
+
+    Returns:
+        Ответ FastAPI
+    """
+    body = dumps(content)
+    headers = {'Vary': 'Accept-Encoding'}
+
+    if len(body) >= config.COMPRESS_MIN_SIZE:
+        encoding = choose_encoding(request.headers.get('accept-encoding'))
+        if encoding == 'br':
+            body = brotli.compress(body, quality=config.BROTLI_QUALITY)
+            headers['Content-Encoding'] = 'br'
+        elif encoding == 'gzip':
+            body = gzip.compress(body, compresslevel=config.GZIP_LEVEL)
+            headers['Content-Encoding'] = 'gzip'
+
+    return Response(content=body, status_code=status_code, media_type='application/json', headers=headers)
@@ -0,0 +1,87 @@
+"""
+Кэш распарсенных результатов поиска в памяти (LRU с временем жизни).
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+import config
+
+# Параметры поиска, которые определяют ключ кэша
+SEARCH_PARAMS = ('query', 'domain', 'num', 'gl', 'hl', 'lr', 'cr', 'location')
+
+
+def search_key(params: Dict[str, Any], include: Optional[Iterable[str]] = None) -> Tuple:
+    """Ключ кэша: параметры поиска и набор дополнительных блоков выдачи."""
+    return tuple(params.get(name) for name in SEARCH_PARAMS) + (tuple(sorted(include or ())),)
+
+
+class ResultCache:
+    """
+    LRU-кэш результатов. Запись живет ttl секунд; устаревшие записи не
+    удаляются сразу, чтобы их можно было отдать, когда Google недоступен.
+    """
+
+    def __init__(self, ttl: int = None, max_entries: int = None):
+        """
+        Args:
+            ttl: Время жизни записи, сек.
+            max_entries: Максимальное количество записей
+        """
+        self.ttl = ttl if ttl is not None else config.CACHE_TTL
+        self.max_entries = max_entries or config.CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, params: Dict[str, Any], include: Optional[Iterable[str]] = None,
+            allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает запись кэша.
+
+        Args:
+            params: Параметры поиска
+            include: Дополнительные блоки выдачи
+            allow_stale: Отдавать и устаревшие записи
+
+        Returns:
+            Запись {"parsed_data", "stored_at", "expires_at"} или None
+        """
+        key = search_key(params, include)
+        entry = self._entries.get(key)
+        if entry is None or (not allow_stale and entry["expires_at"] <= time.time()):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def peek(self, params: Dict[str, Any], include: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """Возвращает запись (в том числе устаревшую), не влияя на статистику и порядок LRU."""
+        return self._entries.get(search_key(params, include))
+
+    def put(self, params: Dict[str, Any], include: Optional[Iterable[str]], parsed_data: Dict[str, Any]) -> None:
+        """Сохраняет результат в кэш."""
+        if self.ttl <= 0:
+            return
+        now = time.time()
+        key = search_key(params, include)
+        self._entries[key] = {
+            "parsed_data": parsed_data,
+            "stored_at": now,
+            "expires_at": now + self.ttl,
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
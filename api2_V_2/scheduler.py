@@ -0,0 +1,311 @@
+"""
+Планировщик регулярных поисковых запросов.
+Запросы каждого расписания равномерно (со случайным сдвигом) распределяются
+по его временному окну, выполняются через общий конвейер SearchPipeline и
+сохраняются в кэш и (по желанию) в историю позиций.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+import uuid
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+import config
+from hedging import percentile
+from page_parser import DekstopScrape
+from log_setup import request_id_var
+from geotargets import canonical_params
+
+logger = logging.getLogger('google_requester')
+
+DAY = 86400
+
+
+def parse_time_of_day(value: str) -> int:
+    """Переводит строку "HH:MM" в секунды от начала суток (UTC)."""
+    hours, minutes = value.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Некорректное время: {value}")
+    return hours * 3600 + minutes * 60
+
+
+def cycle_window(schedule: Dict[str, Any], cycle_start: float) -> Tuple[float, float]:
+    """
+    Возвращает окно выполнения расписания внутри цикла.
+
+    Args:
+        schedule: Расписание
+        cycle_start: Начало цикла (unix time)
+
+    Returns:
+        (начало окна, конец окна)
+    """
+    if not schedule.get("window_start"):
+        return cycle_start, cycle_start + schedule["frequency_seconds"]
+    start = parse_time_of_day(schedule["window_start"])
+    end = parse_time_of_day(schedule["window_end"])
+    if end <= start:
+        end += DAY  # Окно переходит через полночь
+    return cycle_start + start, cycle_start + end
+
+
+class SearchScheduler:
+    """
+    Выполняет регулярные поисковые запросы, распределяя их по времени.
+    """
+
+    def __init__(self, pipeline, cache, tracker, path: str = None):
+        """
+        Args:
+            pipeline: SearchPipeline
+            cache: ResultCache
+            tracker: RankTracker
+            path: Файл для хранения расписаний
+        """
+        self.pipeline = pipeline
+        self.cache = cache
+        self.tracker = tracker
+        self.path = path or config.SCHEDULES_FILE
+        self.schedules: Dict[str, Dict[str, Any]] = {}
+        # Очередь запланированных запусков: (время, порядковый номер, id расписания, индекс запроса)
+        self._queue: List[Tuple[float, int, str, int]] = []
+        self._seq = itertools.count()
+        self._running = set()
+        self._active = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.lags = deque(maxlen=1000)
+        self.counters = {"completed": 0, "failed": 0, "missed_cycles": 0, "missed_runs": 0}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for schedule in json.load(f):
+                    self.schedules[schedule["id"]] = schedule
+            logger.info(f"Загружено расписаний: {len(self.schedules)}")
+        except Exception as e:
+            logger.error(f"Не удалось загрузить расписания: {e}")
+
+    def _save(self) -> None:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self.schedules.values()), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, schedule: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Добавляет расписание.
+
+        Args:
+            schedule: {"name", "searches", "frequency_seconds", "window_start", "window_end",
+                       "include", "track"}
+
+        Returns:
+            Сохраненное расписание (с id)
+        """
+        if bool(schedule.get("window_start")) != bool(schedule.get("window_end")):
+            raise ValueError("window_start и window_end задаются вместе")
+        if schedule.get("window_start"):
+            parse_time_of_day(schedule["window_start"])
+            parse_time_of_day(schedule["window_end"])
+            if schedule["frequency_seconds"] % DAY:
+                raise ValueError("Окно времени можно задать только для частоты, кратной суткам")
+        if schedule["frequency_seconds"] < config.SCHEDULER_MIN_FREQUENCY:
+            raise ValueError(f"Частота должна быть не меньше {config.SCHEDULER_MIN_FREQUENCY} сек.")
+        if not schedule.get("searches"):
+            raise ValueError("Расписание не содержит запросов")
+        schedule = dict(schedule, searches=[canonical_params(search) for search in schedule["searches"]])
+
+        schedule = dict(schedule, id=uuid.uuid4().hex[:12], created_at=time.time())
+        self.schedules[schedule["id"]] = schedule
+        self._save()
+        if self._wakeup:
+            self._wakeup.set()
+        return schedule
+
+    def remove(self, schedule_id: str) -> bool:
+        """Удаляет расписание (уже запланированные запуски пропускаются)."""
+        if self.schedules.pop(schedule_id, None) is None:
+            return False
+        self._save()
+        return True
+
+    def _restore(self, now: float) -> None:
+        """
+        Возвращает в очередь запуски, спланированные до перезапуска сервиса и еще
+        не выполненные. Запуски, окно которых уже закончилось, считаются пропущенными.
+        """
+        changed = False
+        for schedule in self.schedules.values():
+            pending = []
+            for due, index, window_end in schedule.get("pending", []):
+                if now >= window_end or index >= len(schedule["searches"]):
+                    self.counters["missed_runs"] += 1
+                    continue
+                pending.append([due, index, window_end])
+                heapq.heappush(self._queue, (due, next(self._seq), schedule["id"], index))
+            if pending != schedule.get("pending", []):
+                schedule["pending"] = pending
+                changed = True
+        if changed:
+            self._save()
+
+    def _plan(self, now: float) -> None:
+        """
+        Планирует запуски для расписаний, у которых начался новый цикл.
+        Следующий цикл ("next_cycle") и невыполненные запуски ("pending") хранятся
+        в расписании и сохраняются в файл: после перезапуска сервиса уже спланированный
+        цикл не планируется повторно, а его оставшиеся запуски восстанавливаются.
+        """
+        changed = False
+        for schedule in self.schedules.values():
+            frequency = schedule["frequency_seconds"]
+            # Циклы выровнены по полуночи UTC
+            current_cycle = now - now % frequency
+            next_cycle = schedule.get("next_cycle")
+            if next_cycle is None:
+                # Новое расписание начинается с текущего цикла
+                next_cycle = current_cycle
+            elif next_cycle < current_cycle:
+                # Сервис был остановлен: пропущенные циклы не выполняем
+                self.counters["missed_cycles"] += int((current_cycle - next_cycle) // frequency)
+                next_cycle = current_cycle
+            while next_cycle <= now:
+                self._plan_cycle(schedule, next_cycle, now)
+                next_cycle += frequency
+            if schedule.get("next_cycle") != next_cycle:
+                schedule["next_cycle"] = next_cycle
+                changed = True
+        if changed:
+            self._save()
+
+    def _plan_cycle(self, schedule: Dict[str, Any], cycle_start: float, now: float) -> None:
+        """Равномерно распределяет запросы расписания по окну цикла."""
+        window_start, window_end = cycle_window(schedule, cycle_start)
+        if now >= window_end:
+            self.counters["missed_cycles"] += 1
+            return
+        # Если окно уже началось - распределяем запросы по оставшейся его части
+        window_start = max(window_start, now)
+        count = len(schedule["searches"])
+        step = (window_end - window_start) / count
+        # Случайная фаза, чтобы запуски разных расписаний с одинаковым окном не совпадали
+        phase = random.random()
+        for index in range(count):
+            jitter = random.uniform(-config.SCHEDULER_JITTER, config.SCHEDULER_JITTER) * step / 2
+            due = window_start + (index + phase) * step + jitter
+            due = min(max(due, window_start), window_end)
+            schedule.setdefault("pending", []).append([due, index, window_end])
+            heapq.heappush(self._queue, (due, next(self._seq), schedule["id"], index))
+
+    def _finish(self, schedule: Dict[str, Any], index: int, due: float) -> None:
+        """Убирает выполненный запуск из сохраняемого списка невыполненных."""
+        pending = schedule.get("pending", [])
+        schedule["pending"] = [run for run in pending if (run[0], run[1]) != (due, index)]
+        if schedule["id"] in self.schedules:
+            self._save()
+
+    async def _execute(self, schedule: Dict[str, Any], index: int, due: float) -> None:
+        """Выполняет один запрос расписания."""
+        async with self._semaphore:
+            self._active += 1
+            request_id_var.set(f"schedule-{schedule['id']}-{index}-{int(due)}")
+            self.lags.append(max(0.0, time.time() - due))
+            params = dict(schedule["searches"][index])
+            include = schedule.get("include") or []
+            try:
+                result = await self.pipeline.fetch(**params)
+                if not result["success"]:
+                    raise RuntimeError(result["error"])
+                parsed_data = await DekstopScrape().make_json(result["html"], include=include)
+                if parsed_data is None:
+                    raise RuntimeError("Ошибка при парсинге результатов")
+
+                self.cache.put(params, include, parsed_data)
+                if schedule.get("track"):
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(None, self.tracker.track, params, parsed_data.get("organic", []))
+                self.counters["completed"] += 1
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.warning(f"Запрос по расписанию {schedule['id']} ('{params.get('query')}') не выполнен: {e}")
+            finally:
+                self._active -= 1
+            # Прерванный остановкой сервиса запуск (CancelledError) остается в списке и будет повторен
+            self._finish(schedule, index, due)
+
+    async def _loop(self) -> None:
+        self._restore(time.time())
+        while True:
+            now = time.time()
+            self._plan(now)
+
+            while self._queue and self._queue[0][0] <= now:
+                due, _, schedule_id, index = heapq.heappop(self._queue)
+                schedule = self.schedules.get(schedule_id)
+                if schedule is None or index >= len(schedule["searches"]):
+                    continue
+                task = asyncio.ensure_future(self._execute(schedule, index, due))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            timeout = config.SCHEDULER_TICK
+            if self._queue:
+                timeout = min(timeout, max(0.0, self._queue[0][0] - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """Запускает планировщик (вызывается при старте сервиса)."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(config.SCHEDULER_CONCURRENCY)
+            self._task = asyncio.ensure_future(self._loop())
+
+    def stop(self) -> None:
+        """Останавливает планировщик и выполняющиеся запросы."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Возвращает очередь, отставание от расписания и счетчики."""
+        now = time.time()
+        waiting = sum(1 for due, *_ in self._queue if due <= now)
+
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+
+        return {
+            "schedules": len(self.schedules),
+            "planned": len(self._queue),
+            # Запуски, время которых наступило, но которые еще не завершены
+            "backlog": waiting + len(self._running),
+            "running": self._active,
+            "next_run_in": rounded(self._queue[0][0] - now) if self._queue else None,
+            "lag_p50": rounded(percentile(self.lags, 50)),
+            "lag_p99": rounded(percentile(self.lags, 99)),
+            "lag_max": rounded(max(self.lags)) if self.lags else None,
+            **self.counters,
+        }
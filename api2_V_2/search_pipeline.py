@@ -0,0 +1,265 @@
+"""
+Общий конвейер выполнения поисковых запросов.
+Связывает пул профилей, воркеры драйверов, контроль процессов браузера,
+контроль частоты, хеджирование, circuit breaker и GoogleRequester.
+"""
+
+import asyncio
+import functools
+import random
+import time
+import logging
+from typing import Dict, Any, Optional
+
+from page_requester import GoogleRequester
+from driver_workers import DriverWorkerPool
+from browser_supervisor import BrowserSupervisor
+from profile_pool import ProfilePool
+from rate_controller import RateController, SUCCESS, CAPTCHA, ERROR
+from hedging import HedgePolicy
+from circuit_breaker import BreakerRegistry
+import config
+
+logger = logging.getLogger('google_requester')
+
+
+class _Attempt:
+    """Состояние одной попытки выполнить запрос (нужно для хеджирования)."""
+
+    def __init__(self, tickets: Dict[str, Any], avoid_port: Optional[str] = None,
+                 avoid_user_agent: Optional[str] = None, prefer_port: Optional[str] = None):
+        # Пропуски circuit breaker-ов, выданные запросу
+        self.tickets = tickets
+        self.avoid_port = avoid_port
+        # Порт, выбранный заранее (профиль с этим портом или сам порт, если профиля нет)
+        self.prefer_port = prefer_port
+        self.avoid_user_agent = avoid_user_agent
+        self.requester: Optional[GoogleRequester] = None
+        self.proxy_port: Optional[str] = None
+        self.started = time.monotonic()
+        # Длительность завершившейся попытки (None - попытка еще идет или отменена)
+        self.finished_after: Optional[float] = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+class SearchPipeline:
+    """
+    Выполняет поисковые запросы через общий набор ресурсов
+    (профили браузера, потоки драйверов, контроль частоты по прокси и доменам).
+    """
+
+    def __init__(self):
+        # Пул постоянных профилей браузера (cookies и состояние диалогов между запусками)
+        self.profile_pool = ProfilePool() if config.USE_PROFILES else None
+        # Адаптивный контроль частоты по прокси-портам и доменам
+        self.rate_controller = RateController()
+        # Выделенные потоки драйверов; их количество ограничивает число одновременных браузеров
+        self.worker_pool = DriverWorkerPool()
+        # Контроль памяти и зависаний процессов браузера
+        self.supervisor = BrowserSupervisor()
+        # Хеджирование медленных запросов
+        self.hedge_policy = HedgePolicy()
+        # Быстрый отказ, пока Google отвечает капчами и ошибками
+        self.breakers = BreakerRegistry()
+        # Отмененные попытки, которые еще освобождают свои ресурсы
+        self._background = set()
+
+    def start(self) -> None:
+        """Запускает фоновые задачи конвейера (вызывается при старте сервиса)."""
+        self.supervisor.start()
+
+    def shutdown(self) -> None:
+        """Освобождает ресурсы конвейера при остановке сервиса."""
+        self.supervisor.stop()
+        self.worker_pool.stop()
+
+    async def fetch(self, query: str, domain: Optional[str] = None, num: Optional[int] = None,
+                    gl: Optional[str] = None, hl: Optional[str] = None, lr: Optional[str] = None,
+                    cr: Optional[str] = None, location: Optional[str] = None,
+                    hedge: bool = False, proxy_port: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Выполняет поисковый запрос с учетом контроля частоты.
+
+        Args:
+            query: Поисковый запрос
+            domain: Домен Google
+            num: Количество результатов
+            gl: Параметр геолокализации
+            hl: Язык интерфейса
+            lr: Язык результатов
+            cr: Страна результатов
+            location: Строка с местоположением
+            hedge: Запустить вторую попытку, если первая выполняется слишком долго
+            proxy_port: Прокси-порт, проверенный заранее (см. next_port)
+
+        Returns:
+            Словарь с результатами запроса (см. GoogleRequester.search_google_async)
+
+        Raises:
+            CircuitOpenError: если цепь домена или прокси-хоста разомкнута
+        """
+        params = {
+            "query": query,
+            "domain": domain or config.DEFAULT_SEARCH_DOMAIN,
+            "num": num,
+            "gl": gl,
+            "hl": hl,
+            "lr": lr,
+            "cr": cr,
+            "location": location,
+        }
+        proxy_host = config.PROXY_HOST if config.USE_PROXY else None
+        tickets = self.breakers.acquire(params["domain"], proxy_host)
+
+        result = None
+        try:
+            if hedge:
+                result = await self._fetch_hedged(params, tickets)
+            else:
+                result = await self._fetch_once(params, _Attempt(tickets, prefer_port=proxy_port))
+        finally:
+            # Отмененный запрос (result is None) только освобождает пробный слот
+            self.breakers.record(tickets, result)
+        return result
+
+    def next_port(self) -> str:
+        """
+        Прокси-порт, через который сейчас пошел бы запрос: порт профиля, который
+        выдаст пул, или (без свободного профиля) порт, выбранный контролем частоты.
+        Передается в fetch(proxy_port=...), чтобы запрос пошел через проверенный порт.
+        """
+        port = self.profile_pool.peek_port() if self.profile_pool else None
+        return port or self.rate_controller.pick_port()
+
+    async def _fetch_hedged(self, params: Dict[str, Any], tickets: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Выполняет запрос с хеджированием: если первая попытка не уложилась в
+        перцентиль задержки, запускается вторая через другой прокси и User-Agent.
+        Побеждает первый успешный результат, проигравшая попытка отменяется,
+        а ее браузер принудительно закрывается.
+        """
+        policy = self.hedge_policy
+        primary = _Attempt(tickets)
+        primary_task = asyncio.ensure_future(self._fetch_once(params, primary))
+        tasks = {primary_task: primary}
+
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=policy.delay())
+            if done:
+                latency = primary.elapsed()
+                policy.record(False, latency, latency)
+                return primary_task.result()
+
+            # Хедж запускается только в пределах бюджета и при наличии свободного браузера
+            if not policy.allow():
+                policy.counters["budget_denied"] += 1
+            elif self.worker_pool.free_count == 0:
+                policy.counters["no_capacity"] += 1
+            else:
+                primary_ua = primary.requester.current_user_agent if primary.requester else None
+                hedge = _Attempt(tickets, avoid_port=primary.proxy_port, avoid_user_agent=primary_ua)
+                tasks[asyncio.ensure_future(self._fetch_once(params, hedge))] = hedge
+                logger.info(f"Запущен хедж для '{params['query']}' через {primary.elapsed():.1f} сек.")
+
+            if len(tasks) == 1:
+                result = await primary_task
+                latency = primary.elapsed()
+                policy.record(False, latency, latency)
+                return result
+
+            result, winner = None, None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task_result = task.result()
+                    if result is None or (task_result["success"] and not result["success"]):
+                        result, winner = task_result, task
+                if result["success"]:
+                    break
+
+            served = primary.elapsed()
+            # Оценка нужна, только если первая попытка отменена; завершившаяся (неудачно) первая
+            # попытка учитывается с ее настоящей длительностью
+            primary_cancelled = not primary_task.done()
+            primary_latency = served if primary_cancelled else primary.finished_after
+            policy.record(True, served, primary_latency, hedge_won=winner is not primary_task,
+                          primary_cancelled=primary_cancelled)
+            return result
+        finally:
+            for task, attempt in tasks.items():
+                if not task.done():
+                    self._cancel_attempt(task, attempt)
+
+    def _cancel_attempt(self, task: asyncio.Task, attempt: _Attempt) -> None:
+        """Отменяет попытку и принудительно закрывает ее браузер."""
+        if attempt.requester and attempt.requester.driver:
+            # recycle ждет завершения процессов браузера, поэтому выполняем его вне цикла событий
+            asyncio.get_running_loop().run_in_executor(None, self.supervisor.recycle, attempt.requester.driver)
+        task.cancel()
+        # Держим ссылку на задачу, пока она освобождает профиль и поток драйвера
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _fetch_once(self, params: Dict[str, Any], attempt: _Attempt) -> Dict[str, Any]:
+        """Выполняет одну попытку запроса."""
+        domain = params["domain"]
+
+        # Берем свободный профиль из пула (если все заняты - работаем во временном профиле)
+        profile = self.profile_pool.acquire(
+            exclude_port=attempt.avoid_port, prefer_port=attempt.prefer_port
+        ) if self.profile_pool else None
+        if profile:
+            proxy_port = profile.proxy_port
+        else:
+            proxy_port = attempt.prefer_port or self.rate_controller.pick_port(exclude=attempt.avoid_port)
+        attempt.proxy_port = proxy_port
+
+        user_agent = None
+        if attempt.avoid_user_agent:
+            user_agent = random.choice(
+                [ua for ua in config.USER_AGENTS if ua != attempt.avoid_user_agent] or config.USER_AGENTS
+            )
+        result = {}
+
+        try:
+            # Сначала ждем, пока частота запросов к домену и через порт это позволит, и только
+            # потом занимаем поток драйвера: иначе все браузеры могут простаивать в ожидании
+            # одного домена, пока запросы к другим доменам ждут свободный браузер
+            await self.rate_controller.acquire(domain, proxy_port)
+            # Пока запрос ждал, цепь могла разомкнуться - тогда браузер не запускаем
+            self.breakers.check(attempt.tickets)
+
+            # Ждем свободный поток драйвера (ограничение на число одновременных браузеров)
+            worker = await self.worker_pool.acquire()
+            try:
+                requester = GoogleRequester(profile=profile, proxy_port=proxy_port, worker=worker,
+                                            supervisor=self.supervisor, user_agent=user_agent)
+                attempt.requester = requester
+                result = await requester.search_google_async(
+                    **params,
+                    test_pause=0  # Не используем паузу в API
+                )
+            finally:
+                self.worker_pool.release(worker)
+        finally:
+            if profile:
+                # Сохранение и ротация профиля - дисковые операции, выполняем их вне цикла событий
+                asyncio.get_running_loop().run_in_executor(
+                    None, functools.partial(self.profile_pool.release, profile, captcha=bool(result.get("captcha")))
+                )
+
+        # Учитываем исход запроса в контроле частоты
+        if result["success"]:
+            outcome = SUCCESS
+        elif result["captcha"]:
+            outcome = CAPTCHA
+        else:
+            outcome = ERROR
+        self.rate_controller.record(domain, proxy_port, outcome)
+
+        attempt.finished_after = attempt.elapsed()
+        self.hedge_policy.observe_attempt(attempt.finished_after)
+        return result
@@ -1,7 +1,7 @@
 from page_requester import GoogleRequester
 from page_parser import DekstopScrape
+from responses import dumps
 import asyncio
-import json
 
 requester = GoogleRequester()
 scraper = DekstopScrape()
@@ -10,4 +10,4 @@ answer = asyncio.run(requester.search_google_async(query='burger', num=10))
 
 
 d = asyncio.run(scraper.make_json(answer['html']))
-print(json.dumps(d, indent=4))
\ No newline at end of file
+print(dumps(d, indent=True).decode())
\ No newline at end of file